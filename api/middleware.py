@@ -0,0 +1,78 @@
+import time
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+import metrics
+
+# Ruang ekstra untuk header multipart & field form selain file
+MULTIPART_OVERHEAD = 64 * 1024
+
+class UploadLimitMiddleware:
+    """Tolak request body yang melebihi max_bytes sedini mungkin (Content-Length atau saat body di-stream)."""
+
+    def __init__(self, app, max_bytes: int, path_limits: dict = None):
+        self.app = app
+        self.max_bytes = max_bytes + MULTIPART_OVERHEAD
+        # Batas khusus per prefix path, mis. {"/api/batch/": 100 MB}
+        self.path_limits = {prefix: limit + MULTIPART_OVERHEAD for prefix, limit in (path_limits or {}).items()}
+
+    def limit_for(self, path: str) -> int:
+        for prefix, limit in self.path_limits.items():
+            if path.startswith(prefix):
+                return limit
+        return self.max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in ("POST", "PUT"):
+            await self.app(scope, receive, send)
+            return
+
+        max_bytes = self.limit_for(scope["path"])
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length and content_length.isdigit() and int(content_length) > max_bytes:
+            response = JSONResponse(status_code=413, content={"detail": "File terlalu besar."})
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_bytes:
+                    # Upload chunked tanpa Content-Length: hentikan begitu batas terlewati
+                    raise HTTPException(status_code=413, detail="File terlalu besar.")
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+class MetricsMiddleware:
+    """Catat durasi & status setiap request HTTP per template route (mis. /api/jobs/{job_id}) ke /metrics."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] == "/metrics":
+            await self.app(scope, receive, send)
+            return
+
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        metrics.http_inflight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            metrics.http_inflight.dec()
+            # Template route dipakai sebagai label agar ID job dll. tidak membuat seri baru
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            metrics.http_seconds.observe(
+                time.perf_counter() - start, method=scope["method"], route=route, status=str(status["code"])
+            )
@@ -1,9 +1,15 @@
 import os
-import shutil
 import uuid
+import json
+import asyncio
+from typing import List, Optional
+from pydantic import BaseModel
 from fastapi import APIRouter, UploadFile, File, Form, HTTPException, BackgroundTasks
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+import config
 import services
+import jobs
+import sessions
 
 # Membuat Router
 router = APIRouter()
@@ -13,32 +19,47 @@ def cleanup_file(path: str):
     if os.path.exists(path):
         os.remove(path)
 
+# --- HELPER: Tolak Upload yang Melebihi MAX_FILE_SIZE_MB ---
+def check_upload_size(file: UploadFile):
+    if file.size is not None and file.size > config.MAX_FILE_SIZE_MB * 1024 * 1024:
+        raise HTTPException(status_code=413, detail=f"File terlalu besar (Max {config.MAX_FILE_SIZE_MB} MB).")
+
 # --- 1. ENDPOINT OCR (Gambar -> Teks) ---
 @router.post("/api/ocr")
-async def api_ocr(file: UploadFile = File(...)):
+async def api_ocr(file: List[UploadFile] = File(...)):
+    for f in file:
+        check_upload_size(f)
     try:
         # Baca bytes gambar langsung dari RAM
-        content = await file.read()
-        text = services.ocr_with_gemini(content)
+        contents = [await f.read() for f in file]
 
-        if not text:
-            raise HTTPException(status_code=400, detail="Gagal membaca gambar.")
+        if len(contents) == 1:
+            text = await services.ocr_with_gemini(contents[0])
 
-        return {"status": "success", "text": text}
+            if not text:
+                raise HTTPException(status_code=400, detail="Gagal membaca gambar.")
+
+            return {"status": "success", "text": text}
+
+        # Multi upload: OCR per batch, hasil per gambar
+        texts = await services.ocr_batch(contents)
+        results = [
+            {"filename": f.filename, "text": text, "error": None if text else "Gagal membaca gambar."}
+            for f, text in zip(file, texts)
+        ]
+        return {"status": "success", "results": results}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 # --- 2. ENDPOINT EXTRACT FILE (PDF/DOCX -> Teks) ---
 @router.post("/api/extract")
 async def api_extract(file: UploadFile = File(...)):
-    temp_path = f"temp_api_{uuid.uuid4()}_{file.filename}"
+    check_upload_size(file)
     try:
-        # Simpan file upload ke disk sementara
-        with open(temp_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-
-        # Ekstrak
-        text = services.extract_document_content(temp_path)
+        # Ekstrak langsung dari buffer upload (spooled), tanpa salinan file sementara
+        text = await asyncio.to_thread(
+            services.extract_document_content, file.file, config.MAX_SUMMARY_CHARS, file.filename or ""
+        )
 
         if not text:
             raise HTTPException(status_code=400, detail="File kosong atau tidak terbaca.")
@@ -46,15 +67,14 @@ async def api_extract(file: UploadFile = File(...)):
         return {"status": "success", "text": text}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        # Bersihkan file temp
-        cleanup_file(temp_path)
 
 # --- 3. ENDPOINT SUMMARIZE (Teks -> Ringkasan) ---
 @router.post("/api/summarize")
 async def api_summarize(text: str = Form(...)):
+    if len(text) > config.MAX_SUMMARY_CHARS:
+        raise HTTPException(status_code=413, detail=f"Teks kepanjangan (Max {config.MAX_SUMMARY_CHARS}).")
     try:
-        summary = services.summarize_text(text)
+        summary = await services.summarize_text(text)
         if summary.startswith("⚠️"):
              raise HTTPException(status_code=500, detail=summary)
         return {"status": "success", "summary": summary}
@@ -64,8 +84,10 @@ async def api_summarize(text: str = Form(...)):
 # --- 4. ENDPOINT TRANSLATE (Teks -> Terjemahan) ---
 @router.post("/api/translate")
 async def api_translate(text: str = Form(...), target_lang: str = Form(...)):
+    if len(text) > config.MAX_TRANSLATE_CHARS:
+        raise HTTPException(status_code=413, detail=f"Teks kepanjangan (Max {config.MAX_TRANSLATE_CHARS}).")
     try:
-        result = services.translate_text(text, target_lang)
+        result = await services.translate_text(text, target_lang)
         return {"status": "success", "translated_text": result}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -81,7 +103,7 @@ async def api_tts(
     try:
         # Generate Audio
         # Gunakan 'api_user' sebagai ID dummy
-        filename = await services.generate_audio(text, lang, gender, f"api_{uuid.uuid4()}")
+        filename = await services.generate_audio_long(text, lang, gender, f"api_{uuid.uuid4()}")
 
         if not filename:
             raise HTTPException(status_code=500, detail="Gagal generate audio.")
@@ -91,4 +113,206 @@ async def api_tts(
 
         return FileResponse(filename, media_type="audio/mpeg", filename="tts_output.mp3")
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+# --- 6. ENDPOINT TTS STREAMING (Teks -> Audio Stream) ---
+@router.post("/api/tts/stream")
+async def api_tts_stream(
+    text: str = Form(...),
+    lang: str = Form(...),
+    gender: str = Form(...)
+):
+    if not text.strip():
+        raise HTTPException(status_code=400, detail="Teks kosong.")
+
+    # Audio dikirim bertahap (chunked), tanpa file sementara
+    return StreamingResponse(
+        services.stream_audio(text, lang, gender),
+        media_type="audio/mpeg",
+        headers={"Content-Disposition": 'inline; filename="tts_output.mp3"'}
+    )
+
+# --- 7. ENDPOINT STATISTIK CACHE ---
+@router.get("/api/cache/stats")
+async def api_cache_stats():
+    return {
+        "status": "success",
+        "cache": services.result_cache.stats(),
+        "audio_cache": services.audio_cache.stats(),
+        "sessions": sessions.session_store.stats(),
+        "single_flight": {
+            flight.name: flight.stats()
+            for flight in (services.gemini_flight, services.preprocess_flight, services.tts_flight)
+        }
+    }
+
+# --- 8. ENDPOINT BATCH (Banyak Item -> Hasil NDJSON) ---
+class BatchTextItem(BaseModel):
+    id: Optional[str] = None
+    text: str
+
+class BatchSummarizeRequest(BaseModel):
+    items: List[BatchTextItem]
+
+class BatchTranslateItem(BatchTextItem):
+    target_lang: Optional[str] = None
+
+class BatchTranslateRequest(BaseModel):
+    target_lang: str
+    items: List[BatchTranslateItem]
+
+def check_batch_size(count: int):
+    if count == 0:
+        raise HTTPException(status_code=400, detail="Batch kosong.")
+    if count > config.BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Batch terlalu besar (Max {config.BATCH_MAX_ITEMS} item).")
+
+async def stream_batch(items, process_item):
+    """
+    Jalankan process_item(item) untuk semua item (dibatasi BATCH_CONCURRENCY) dan
+    yield satu baris NDJSON per hasil begitu selesai. Error per item tidak menggagalkan batch.
+    Hasil boleh mengisi "index"/"status" sendiri (mis. OCR: satu item = satu kelompok beberapa file).
+    """
+    limiter = asyncio.Semaphore(config.BATCH_CONCURRENCY)
+
+    async def run(index, item):
+        # Item batch antre di kelas prioritas terendah
+        services.gemini_priority.set(services.PRIORITY_BATCH)
+        async with limiter:
+            try:
+                result = await process_item(item)
+                return [{"index": index, "status": "success", **r} for r in result]
+            except Exception as e:
+                return [{"index": index, "status": "error", "id": getattr(item, "id", None), "error": str(e)}]
+
+    tasks = [asyncio.create_task(run(i, item)) for i, item in enumerate(items)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            for line in await next_done:
+                yield json.dumps(line, ensure_ascii=False) + "\n"
+    finally:
+        # Client putus: batalkan item yang belum selesai
+        for task in tasks:
+            task.cancel()
+
+@router.post("/api/batch/summarize")
+async def api_batch_summarize(body: BatchSummarizeRequest):
+    check_batch_size(len(body.items))
+
+    async def process_item(item: BatchTextItem):
+        if not item.text.strip():
+            raise ValueError("Teks kosong.")
+        if len(item.text) > config.MAX_SUMMARY_CHARS:
+            raise ValueError(f"Teks kepanjangan (Max {config.MAX_SUMMARY_CHARS}).")
+        summary = await services.summarize_text(item.text, strict=True)
+        return [{"id": item.id, "summary": summary}]
+
+    return StreamingResponse(stream_batch(body.items, process_item), media_type="application/x-ndjson")
+
+@router.post("/api/batch/translate")
+async def api_batch_translate(body: BatchTranslateRequest):
+    check_batch_size(len(body.items))
+
+    async def process_item(item: BatchTranslateItem):
+        if not item.text.strip():
+            raise ValueError("Teks kosong.")
+        if len(item.text) > config.MAX_TRANSLATE_CHARS:
+            raise ValueError(f"Teks kepanjangan (Max {config.MAX_TRANSLATE_CHARS}).")
+        target_lang = item.target_lang or body.target_lang
+        result = await services.translate_text(item.text, target_lang, strict=True)
+        return [{"id": item.id, "target_lang": target_lang, "translated_text": result}]
+
+    return StreamingResponse(stream_batch(body.items, process_item), media_type="application/x-ndjson")
+
+@router.post("/api/batch/ocr")
+async def api_batch_ocr(file: List[UploadFile] = File(...)):
+    check_batch_size(len(file))
+    for f in file:
+        check_upload_size(f)
+    contents = [(f.filename, await f.read()) for f in file]
+
+    # Gambar dikelompokkan per OCR_BATCH_SIZE: satu request Gemini per kelompok
+    size = max(1, config.OCR_BATCH_SIZE)
+    groups = [list(enumerate(contents))[i:i + size] for i in range(0, len(contents), size)]
+
+    async def process_group(group):
+        # "index" = urutan file yang diunggah, bukan urutan kelompok
+        try:
+            texts = await services.ocr_batch([data for _, (_, data) in group])
+        except Exception as e:
+            return [
+                {"index": index, "status": "error", "filename": filename, "error": str(e)}
+                for index, (filename, _) in group
+            ]
+        return [
+            {"index": index, "filename": filename, "text": text}
+            if text else
+            {"index": index, "status": "error", "filename": filename, "error": "Gagal membaca gambar."}
+            for (index, (filename, _)), text in zip(group, texts)
+        ]
+
+    return StreamingResponse(stream_batch(groups, process_group), media_type="application/x-ndjson")
+
+# --- 9. ENDPOINT JOB (Proses Panjang di Background) ---
+def job_to_response(job: dict) -> dict:
+    return {
+        "id": job['id'],
+        "status": job['status'],
+        "steps": job['steps'],
+        "progress": round(job['progress'] * 100),
+        "error": job['error'],
+        "created_at": job['created_at'],
+        "updated_at": job['updated_at'],
+        "result_url": f"/api/jobs/{job['id']}/result" if job['status'] == 'done' else None
+    }
+
+@router.post("/api/jobs", status_code=202)
+async def api_create_job(
+    steps: str = Form(...),
+    text: Optional[str] = Form(None),
+    file: Optional[UploadFile] = File(None),
+    target_lang: str = Form("en"),
+    lang: Optional[str] = Form(None),
+    gender: str = Form("female")
+):
+    # steps dipisah koma, mis. "ocr,summarize,translate,tts"
+    step_list = [step.strip() for step in steps.split(",") if step.strip()]
+    if text and step_list[:1] == ["translate"] and len(text) > config.MAX_TRANSLATE_CHARS:
+        raise HTTPException(status_code=413, detail=f"Teks kepanjangan (Max {config.MAX_TRANSLATE_CHARS}).")
+    file_bytes = None
+    if file is not None:
+        check_upload_size(file)
+        file_bytes = await file.read()
+    options = {
+        "target_lang": target_lang,
+        "lang": lang or (target_lang if "translate" in step_list else "id"),
+        "gender": gender
+    }
+    try:
+        job_id = await jobs.job_queue.submit(step_list, text, file_bytes, file.filename if file else "", options)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return job_to_response(await jobs.job_queue.get(job_id))
+
+@router.get("/api/jobs/{job_id}")
+async def api_get_job(job_id: str):
+    job = await jobs.job_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job tidak ditemukan.")
+    return job_to_response(job)
+
+@router.get("/api/jobs/{job_id}/result")
+async def api_get_job_result(job_id: str):
+    job = await jobs.job_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job tidak ditemukan.")
+    if job['status'] != 'done':
+        raise HTTPException(status_code=409, detail=f"Job belum selesai (status: {job['status']}).")
+    if job['result_path']:
+        return FileResponse(job['result_path'], media_type="audio/mpeg", filename="tts_output.mp3")
+    return {"status": "success", "text": job['result_text']}
+
+# --- 10. ENDPOINT STATISTIK KUOTA GEMINI ---
+@router.get("/api/quota/stats")
+async def api_quota_stats():
+    return {"status": "success", "quota": services.quota_scheduler.stats(), "keys": services.key_pool.stats()}
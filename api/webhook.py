@@ -0,0 +1,123 @@
+import asyncio
+import hmac
+import logging
+from fastapi import APIRouter, Request, HTTPException
+from telegram import Update
+from telegram.error import RetryAfter
+import config
+import metrics
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+class UpdateQueue:
+    """Antrean update Telegram berbatas: route webhook cukup memasukkan update, worker yang memprosesnya."""
+
+    def __init__(self, maxsize: int, workers: int):
+        self.maxsize = maxsize
+        self.workers = workers
+        self.application = None
+        self.received = 0
+        self.rejected = 0
+        self._queue = None
+        self._tasks = []
+
+    async def start(self, application):
+        self.application = application
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        # Selesaikan update yang sudah diterima sebelum worker dihentikan
+        if self._queue is not None:
+            try: await asyncio.wait_for(self._queue.join(), timeout=30)
+            except asyncio.TimeoutError: pass
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def put_nowait(self, update) -> bool:
+        """False jika antrean penuh (Telegram akan mengirim ulang update tersebut)."""
+        if self._queue is None:
+            return False
+        try:
+            self._queue.put_nowait(update)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            return False
+        self.received += 1
+        return True
+
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    async def _worker(self):
+        while True:
+            update = await self._queue.get()
+            try:
+                # Error di handler sudah diteruskan ke error_handler oleh process_update
+                await self.application.process_update(update)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Gagal memproses update: {e}")
+            finally:
+                self._queue.task_done()
+
+    def stats(self) -> dict:
+        return {
+            "depth": self.depth(),
+            "maxsize": self.maxsize,
+            "workers": self.workers,
+            "received": self.received,
+            "rejected": self.rejected
+        }
+
+update_queue = UpdateQueue(config.UPDATE_QUEUE_SIZE, config.UPDATE_WORKERS)
+metrics.queue_depth.set_function(update_queue.depth, queue="telegram_updates")
+
+async def setup_webhook(bot):
+    """Daftarkan URL webhook ke Telegram di setiap start (idempoten, aman dipanggil tiap worker).
+
+    Tidak dilewati walau URL sama: WebhookInfo tidak memuat secret, jadi WEBHOOK_SECRET yang diganti
+    (atau allowed_updates / max_connections) hanya sampai ke Telegram lewat set_webhook.
+    """
+    url = config.WEBHOOK_URL.rstrip("/") + config.WEBHOOK_PATH
+    for attempt in range(3):
+        try:
+            await bot.set_webhook(
+                url=url,
+                secret_token=config.WEBHOOK_SECRET or None,
+                allowed_updates=["message", "callback_query"],
+                max_connections=config.WEBHOOK_MAX_CONNECTIONS
+            )
+            break
+        except RetryAfter as e:
+            # Beberapa worker yang start bersamaan bisa terkena batas setWebhook
+            if attempt == 2:
+                raise
+            retry_after = e.retry_after.total_seconds() if hasattr(e.retry_after, "total_seconds") else e.retry_after
+            await asyncio.sleep(retry_after)
+    logger.info(f"Webhook terdaftar: {url}")
+
+@router.post(config.WEBHOOK_PATH, include_in_schema=False)
+async def telegram_webhook(request: Request):
+    if config.WEBHOOK_SECRET:
+        token = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+        if not hmac.compare_digest(token, config.WEBHOOK_SECRET):
+            raise HTTPException(status_code=403, detail="Secret token salah.")
+    if update_queue.application is None:
+        raise HTTPException(status_code=503, detail="Bot belum siap.")
+
+    data = await request.json()
+    update = Update.de_json(data, update_queue.application.bot)
+    if not update_queue.put_nowait(update):
+        # Status non-2xx membuat Telegram mengirim ulang update ini nanti
+        raise HTTPException(status_code=503, detail="Antrean update penuh.")
+    return {"ok": True}
+
+@router.get("/api/webhook/stats")
+async def webhook_stats():
+    return {"status": "success", "mode": config.BOT_MODE, "queue": update_queue.stats()}
@@ -0,0 +1,79 @@
+"""
+Benchmark ekstraksi DOCX: python-docx (jalur lama) vs parser streaming services.iter_docx_paragraphs.
+
+Jalankan dari root project:
+    python -m bench.bench_docx --paragraphs 20000 --tables 200
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+import docx
+
+# Benchmark ini offline: kredensial palsu cukup agar config bisa di-import
+os.environ.setdefault("TELEGRAM_TOKEN", "0:bench")
+os.environ.setdefault("GEMINI_API_KEY", "bench")
+
+import services
+
+
+def build_fixture(path, paragraphs, tables):
+    doc = docx.Document()
+    for i in range(paragraphs):
+        doc.add_paragraph(f"Paragraf {i}: " + "lorem ipsum dolor sit amet " * 8)
+        if tables and i % max(1, paragraphs // tables) == 0:
+            table = doc.add_table(rows=3, cols=3)
+            for r, row in enumerate(table.rows):
+                for c, cell in enumerate(row.cells):
+                    cell.text = f"Sel {i}-{r}-{c}"
+    doc.save(path)
+
+
+def extract_python_docx(path):
+    # Jalur lama: bangun object model penuh, paragraf dulu lalu tabel
+    doc = docx.Document(path)
+    parts = [para.text for para in doc.paragraphs]
+    for table in doc.tables:
+        for row in table.rows:
+            for cell in row.cells:
+                for para in cell.paragraphs:
+                    parts.append(para.text)
+    return "\n".join(parts).strip()
+
+
+def extract_streaming(path):
+    return services.extract_document_content(path)
+
+
+def measure(name, func, path, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        text = func(path)
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    func(path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:<12} best {min(times) * 1000:8.1f} ms | peak mem {peak / 1024 / 1024:7.1f} MB | {len(text)} chars")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--paragraphs", type=int, default=20000)
+    parser.add_argument("--tables", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "fixture.docx")
+        build_fixture(path, args.paragraphs, args.tables)
+        print(f"Fixture: {os.path.getsize(path) / 1024:.0f} KB, {args.paragraphs} paragraf, {args.tables} tabel")
+        measure("python-docx", extract_python_docx, path, args.repeat)
+        measure("streaming", extract_streaming, path, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
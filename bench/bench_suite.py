@@ -0,0 +1,272 @@
+"""
+Benchmark offline untuk fungsi services dan route /api/* dengan Gemini & edge-tts palsu (bench.fakes).
+Melaporkan throughput serta latensi p50/p95/p99 per skenario dan tingkat concurrency.
+
+Jalankan dari root project:
+    python -m bench.bench_suite --scenarios summarize,translate,tts --concurrency 1,8,32 --requests 100
+    python -m bench.bench_suite --gemini-429-rate 0.05 --save hasil.json
+    python -m bench.bench_suite --baseline hasil.json --tolerance 0.2   # exit 1 jika ada regresi
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+from bench import fakes
+from bench import fixtures
+
+import httpx
+
+import config
+import services
+import main
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+def reset_gemini_state():
+    """Bersihkan cooldown 429 dari level sebelumnya agar setiap level concurrency diukur terpisah."""
+    for key in services.key_pool._keys:
+        key['models'].clear()
+    for state in services.quota_scheduler._models.values():
+        state['cooldown_until'] = 0.0
+
+
+# ------------------------------------------------------------------------------
+# SKENARIO: prepare(n) membuat input, run(client, item) -> True jika sukses
+# ------------------------------------------------------------------------------
+
+def _unique_image(base, i):
+    # Byte tambahan setelah penanda akhir JPEG diabaikan decoder, tapi membuat hash input berbeda
+    return base + i.to_bytes(4, "big")
+
+
+async def _run_ocr(client, item):
+    return await services.ocr_with_gemini(item) != services.OCR_FAILED
+
+
+async def _run_summarize(client, item):
+    await services.summarize_text(item, strict=True)
+    return True
+
+
+async def _run_translate(client, item):
+    await services.translate_text(item, "en", strict=True)
+    return True
+
+
+async def _run_tts(client, item):
+    path = await services.generate_audio_long(item[1], "id", "female", f"bench_{item[0]}")
+    if not path:
+        return False
+    os.remove(path)
+    return True
+
+
+async def _run_translate_tts(client, item):
+    _, path = await services.translate_to_audio(item[1], "en", "en", "female", f"bench_{item[0]}", strict=True)
+    if not path:
+        return False
+    os.remove(path)
+    return True
+
+
+async def _run_extract(client, item):
+    data, filename = item
+    return bool(await asyncio.to_thread(services.extract_document_content, data, config.MAX_SUMMARY_CHARS, filename))
+
+
+async def _run_api_summarize(client, item):
+    response = await client.post("/api/summarize", data={"text": item})
+    return response.status_code == 200
+
+
+async def _run_api_translate(client, item):
+    response = await client.post("/api/translate", data={"text": item, "target_lang": "en"})
+    return response.status_code == 200
+
+
+async def _run_api_ocr(client, item):
+    response = await client.post("/api/ocr", files={"file": ("foto.jpg", item, "image/jpeg")})
+    return response.status_code == 200
+
+
+async def _run_api_extract(client, item):
+    data, filename = item
+    response = await client.post("/api/extract", files={"file": (filename, data)})
+    return response.status_code == 200
+
+
+async def _run_api_tts(client, item):
+    response = await client.post("/api/tts", data={"text": item[1], "lang": "id", "gender": "female"})
+    return response.status_code == 200
+
+
+def _images(n):
+    base = fixtures.make_image()
+    return [_unique_image(base, i) for i in range(n)]
+
+
+def _pdf(n):
+    data = fixtures.make_pdf(pages=80, words_per_page=300)
+    return [(data, "bench.pdf")] * n
+
+
+def _docx(n):
+    data = fixtures.make_docx(paragraphs=3000, tables=30)
+    return [(data, "bench.docx")] * n
+
+
+SCENARIOS = {
+    "ocr": (_images, _run_ocr),
+    "summarize": (lambda n: [fixtures.make_text(800, seed=i) for i in range(n)], _run_summarize),
+    "summarize_long": (lambda n: [fixtures.make_text(12000, seed=i) for i in range(n)], _run_summarize),
+    "translate": (lambda n: [fixtures.make_text(1500, seed=i) for i in range(n)], _run_translate),
+    "tts": (lambda n: [(i, fixtures.make_text(400, seed=i)) for i in range(n)], _run_tts),
+    "translate_tts": (lambda n: [(i, fixtures.make_text(12000, seed=i)) for i in range(n)], _run_translate_tts),
+    "extract_pdf": (_pdf, _run_extract),
+    "extract_docx": (_docx, _run_extract),
+    "api_summarize": (lambda n: [fixtures.make_text(800, seed=i) for i in range(n)], _run_api_summarize),
+    "api_translate": (lambda n: [fixtures.make_text(1500, seed=i) for i in range(n)], _run_api_translate),
+    "api_ocr": (_images, _run_api_ocr),
+    "api_extract": (_pdf, _run_api_extract),
+    "api_tts": (lambda n: [(i, fixtures.make_text(400, seed=i)) for i in range(n)], _run_api_tts),
+}
+
+
+# ------------------------------------------------------------------------------
+# RUNNER
+# ------------------------------------------------------------------------------
+
+async def run_level(client, run, items, concurrency):
+    latencies = []
+    errors = 0
+    queue = list(enumerate(items))
+
+    async def worker():
+        nonlocal errors
+        while queue:
+            _, item = queue.pop()
+            start = time.perf_counter()
+            try:
+                ok = await run(client, item)
+            except Exception:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "concurrency": concurrency,
+        "requests": len(items),
+        "errors": errors,
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(len(items) / wall, 2) if wall else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+    }
+
+
+async def run_suite(scenarios, levels, requests):
+    results = {}
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        for name in scenarios:
+            prepare, run = SCENARIOS[name]
+            items = prepare(requests)
+            results[name] = []
+            for level in levels:
+                reset_gemini_state()
+                row = await run_level(client, run, items, level)
+                results[name].append(row)
+                print(
+                    f"{name:<15} c={level:<4} {row['throughput_rps']:8.2f} req/s | "
+                    f"p50 {row['p50_ms']:9.1f} ms | p95 {row['p95_ms']:9.1f} ms | p99 {row['p99_ms']:9.1f} ms | "
+                    f"error {row['errors']}/{row['requests']}"
+                )
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Daftar regresi: p95 naik atau throughput turun lebih dari tolerance dibanding baseline."""
+    regressions = []
+    for name, rows in results.items():
+        base_rows = {row["concurrency"]: row for row in baseline.get(name, [])}
+        for row in rows:
+            base = base_rows.get(row["concurrency"])
+            if not base:
+                continue
+            if base["p95_ms"] and row["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+                regressions.append(f"{name} c={row['concurrency']}: p95 {base['p95_ms']} -> {row['p95_ms']} ms")
+            if base["throughput_rps"] and row["throughput_rps"] < base["throughput_rps"] * (1 - tolerance):
+                regressions.append(
+                    f"{name} c={row['concurrency']}: throughput {base['throughput_rps']} -> {row['throughput_rps']} req/s"
+                )
+    return regressions
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scenarios", default="ocr,summarize,translate,tts,extract_pdf,extract_docx,api_summarize,api_ocr")
+    parser.add_argument("--concurrency", default="1,8,32")
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--gemini-latency", type=float, default=0.5)
+    parser.add_argument("--gemini-error-rate", type=float, default=0.0)
+    parser.add_argument("--gemini-429-rate", type=float, default=0.0)
+    parser.add_argument("--missing-primary", action="store_true", help="Model utama selalu 404 (uji fallback)")
+    parser.add_argument("--tts-latency", type=float, default=0.3)
+    parser.add_argument("--tts-error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--save", help="Simpan hasil ke file JSON")
+    parser.add_argument("--baseline", help="Bandingkan dengan hasil JSON sebelumnya")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = [s for s in scenarios if s not in SCENARIOS]
+    if unknown:
+        parser.error(f"Skenario tidak dikenal: {', '.join(unknown)} (pilihan: {', '.join(SCENARIOS)})")
+    levels = [int(c) for c in args.concurrency.split(",")]
+
+    settings = fakes.install(fakes.FakeSettings(
+        gemini_latency=args.gemini_latency,
+        gemini_error_rate=args.gemini_error_rate,
+        gemini_429_rate=args.gemini_429_rate,
+        missing_models=(services.MODEL_PRIMARY,) if args.missing_primary else (),
+        tts_latency=args.tts_latency,
+        tts_error_rate=args.tts_error_rate,
+        seed=args.seed,
+    ))
+    try:
+        results = asyncio.run(run_suite(scenarios, levels, args.requests))
+    finally:
+        services.shutdown_workers()
+    print(f"Panggilan palsu: {settings.calls}")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESI {line}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main_cli()
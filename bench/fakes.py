@@ -0,0 +1,130 @@
+"""
+Pengganti lokal untuk genai.GenerativeModel dan edge_tts.Communicate agar benchmark/load test
+bisa berjalan tanpa jaringan. Latensi, rasio error, dan rasio 429 bisa diatur.
+
+Pemakaian:
+    from bench import fakes
+    fakes.install(fakes.FakeSettings(gemini_latency=0.8, gemini_429_rate=0.05))
+"""
+import asyncio
+import os
+import random
+import re
+from dataclasses import dataclass, field
+
+# Benchmark tidak butuh kredensial asli; cache dimatikan agar setiap request benar-benar diproses
+os.environ.setdefault("TELEGRAM_TOKEN", "0:bench")
+os.environ.setdefault("GEMINI_API_KEY", "bench")
+os.environ.setdefault("RESULT_CACHE_MAX_ITEMS", "0")
+os.environ.setdefault("TTS_CACHE_MAX_MB", "0")
+
+import edge_tts
+import google.generativeai as genai
+
+import services
+
+_IMAGE_COUNT = re.compile(r"from each of the (\d+) images")
+
+
+@dataclass
+class FakeSettings:
+    gemini_latency: float = 0.5       # detik per request
+    gemini_per_kchar: float = 0.02    # tambahan detik per 1000 karakter input
+    gemini_jitter: float = 0.3        # variasi latensi (+/- fraksi)
+    gemini_error_rate: float = 0.0
+    gemini_429_rate: float = 0.0
+    # Model yang selalu menjawab 404 (untuk menguji fallback ke MODEL_BACKUP)
+    missing_models: tuple = ()
+    summary_words: int = 80
+    tts_latency: float = 0.3          # detik per chunk
+    tts_per_kchar: float = 0.2
+    tts_jitter: float = 0.3
+    tts_error_rate: float = 0.0
+    tts_bytes_per_char: int = 60
+    seed: int = 1234
+    calls: dict = field(default_factory=lambda: {"gemini": 0, "gemini_429": 0, "gemini_error": 0, "tts": 0, "tts_error": 0})
+
+
+settings = FakeSettings()
+_random = random.Random(settings.seed)
+
+
+def _latency(base, per_kchar, jitter, chars):
+    value = base + per_kchar * chars / 1000
+    return max(0.0, value * _random.uniform(1 - jitter, 1 + jitter))
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeGenerativeModel:
+    def __init__(self, model_name, *args, **kwargs):
+        self.model_name = model_name
+        # Sama seperti genai.GenerativeModel: ApiKeyPool.get_model memasang client per key di sini
+        self._async_client = None
+
+    async def generate_content_async(self, content, *args, **kwargs):
+        parts = content if isinstance(content, list) else [content]
+        texts = [p for p in parts if isinstance(p, str)]
+        images = [p for p in parts if isinstance(p, dict)]
+        chars = sum(len(t) for t in texts) + 1000 * len(images)
+        settings.calls["gemini"] += 1
+        await asyncio.sleep(_latency(settings.gemini_latency, settings.gemini_per_kchar, settings.gemini_jitter, chars))
+
+        if self.model_name in settings.missing_models:
+            raise Exception(f"404 models/{self.model_name} is not found")
+        roll = _random.random()
+        if roll < settings.gemini_429_rate:
+            settings.calls["gemini_429"] += 1
+            raise Exception("429 Resource has been exhausted (e.g. check quota).")
+        if roll < settings.gemini_429_rate + settings.gemini_error_rate:
+            settings.calls["gemini_error"] += 1
+            raise Exception("500 Internal error (fake)")
+        return FakeResponse(self._answer(texts, images))
+
+    def _answer(self, texts, images):
+        prompt = texts[0] if texts else ""
+        if images:
+            match = _IMAGE_COUNT.search(prompt)
+            if match:
+                count = int(match.group(1))
+                return "\n".join(f"=== IMAGE {i + 1} ===\nTeks hasil OCR gambar {i + 1}." for i in range(count))
+            return "Teks hasil OCR dari gambar."
+        if "TEXT:\n" in prompt:
+            # Terjemahan: panjang keluaran ~ panjang masukan
+            return prompt.split("TEXT:\n", 1)[1]
+        words = prompt.split()
+        return " ".join(words[-settings.summary_words:])
+
+
+class FakeCommunicate:
+    def __init__(self, text, voice, *args, **kwargs):
+        self.text = text
+        self.voice = voice
+
+    async def stream(self):
+        settings.calls["tts"] += 1
+        await asyncio.sleep(_latency(settings.tts_latency, settings.tts_per_kchar, settings.tts_jitter, len(self.text)))
+        if _random.random() < settings.tts_error_rate:
+            settings.calls["tts_error"] += 1
+            raise Exception("No audio was received (fake)")
+        total = len(self.text) * settings.tts_bytes_per_char
+        step = 4096
+        for offset in range(0, total, step):
+            yield {"type": "audio", "data": b"\xff" * min(step, total - offset)}
+
+
+def install(new_settings: FakeSettings = None):
+    """Pasang fake ke genai & edge_tts (dipakai services lewat atribut modul)."""
+    global settings, _random
+    if new_settings is not None:
+        settings = new_settings
+        _random = random.Random(settings.seed)
+    genai.GenerativeModel = FakeGenerativeModel
+    edge_tts.Communicate = FakeCommunicate
+    # Model per key yang mungkin sudah dibuat sebelum fake dipasang
+    for key in services.key_pool._keys:
+        key['clients'] = None
+    return settings
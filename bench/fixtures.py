@@ -0,0 +1,92 @@
+"""
+Fixture sintetis untuk benchmark: teks, PDF, DOCX, dan gambar (semua dibuat di memori, tanpa file contoh).
+"""
+import io
+import random
+
+import docx
+from PIL import Image, ImageDraw
+
+_WORDS = (
+    "mahasiswa membaca dokumen penting tentang ekonomi sejarah budaya teknologi pendidikan "
+    "kesehatan lingkungan penelitian data analisis hasil metode kesimpulan bab materi kuliah"
+).split()
+
+
+def make_text(words: int, seed: int = 0, paragraph_sentences: int = 6) -> str:
+    """Teks dengan kalimat & paragraf (agar pemecah kalimat/segmen bekerja seperti pada dokumen asli)."""
+    rnd = random.Random(seed)
+    sentences = []
+    count = 0
+    while count < words:
+        length = rnd.randint(8, 20)
+        sentence = " ".join(rnd.choice(_WORDS) for _ in range(length))
+        sentences.append(sentence.capitalize() + ".")
+        count += length
+    paragraphs = [
+        " ".join(sentences[i:i + paragraph_sentences]) for i in range(0, len(sentences), paragraph_sentences)
+    ]
+    return "\n\n".join(paragraphs)
+
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def make_pdf(pages: int, words_per_page: int = 300, seed: int = 0) -> bytes:
+    """PDF minimal (font Helvetica bawaan) dengan teks yang bisa diekstrak PyPDF2."""
+    objects = [None, None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for page in range(pages):
+        text = make_text(words_per_page, seed=seed * 100003 + page).replace("\n\n", " ")
+        words = text.split()
+        lines = [" ".join(words[i:i + 12]) for i in range(0, len(words), 12)]
+        stream = "BT /F1 10 Tf 14 TL 50 780 Td " + " ".join(f"({_pdf_escape(line)}) Tj T*" for line in lines) + " ET"
+        content_id = len(objects) + 2
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>"
+        )
+        kids.append(f"{len(objects)} 0 R")
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+    objects[0] = "<< /Type /Catalog /Pages 2 0 R >>"
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {pages} >>"
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for i, obj in enumerate(objects):
+        offsets.append(out.tell())
+        out.write(f"{i + 1} 0 obj\n{obj}\nendobj\n".encode("latin-1"))
+    xref = out.tell()
+    out.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode())
+    for offset in offsets:
+        out.write(f"{offset:010d} 00000 n \n".encode())
+    out.write(f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode())
+    return out.getvalue()
+
+
+def make_docx(paragraphs: int, tables: int = 0, seed: int = 0) -> bytes:
+    doc = docx.Document()
+    for i in range(paragraphs):
+        doc.add_paragraph(make_text(40, seed=seed * 100003 + i, paragraph_sentences=100))
+        if tables and i % max(1, paragraphs // tables) == 0:
+            table = doc.add_table(rows=3, cols=3)
+            for r, row in enumerate(table.rows):
+                for c, cell in enumerate(row.cells):
+                    cell.text = f"Sel {i}-{r}-{c}"
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+
+def make_image(width: int = 2400, height: int = 3200, seed: int = 0) -> bytes:
+    """Foto halaman (JPEG) berukuran kamera ponsel, agar biaya preprocess OCR ikut terukur."""
+    rnd = random.Random(seed)
+    image = Image.new("RGB", (width, height), (250, 248, 240))
+    draw = ImageDraw.Draw(image)
+    for y in range(80, height - 80, 60):
+        draw.text((80, y), " ".join(rnd.choice(_WORDS) for _ in range(12)), fill=(20, 20, 20))
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
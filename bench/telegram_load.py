@@ -0,0 +1,405 @@
+"""
+Load test end-to-end alur bot Telegram tanpa Telegram: update sintetis (pesan, foto, dokumen, klik tombol)
+dari ribuan pengguna simulasi masuk ke app.update_queue seperti update hasil polling, lalu diproses oleh
+Application yang sama dengan produksi (main.build_application), dengan Bot API palsu yang
+mencatat setiap editMessageText / sendDocument / sendAudio, plus Gemini & edge-tts palsu (bench.fakes).
+
+Melaporkan latensi per alur, volume edit pesan (termasuk edit yang melanggar ~1 edit/detik per chat),
+dan pertumbuhan memori selama pengujian.
+
+Jalankan dari root project:
+    python -m bench.telegram_load --users 1000 --ramp 60 --mix summarize_tts=4,translate=3,ocr=2,document=1
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import tempfile
+import time
+from collections import Counter, defaultdict
+
+# Database & file job benchmark dipisah dari milik server
+_WORKDIR = tempfile.mkdtemp(prefix="svara_load_")
+os.environ.setdefault("JOB_DB", os.path.join(_WORKDIR, "jobs.db"))
+os.environ.setdefault("JOB_DIR", os.path.join(_WORKDIR, "jobs"))
+
+from bench import fakes
+from bench import fixtures
+
+from telegram import Update
+from telegram.ext import TypeHandler
+from telegram.request import BaseRequest
+
+import jobs
+import sessions
+import main
+from bench.bench_suite import percentile
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "SvaraAI", "username": "svaraai_bot"}
+# Telegram membatasi kira-kira 1 edit/pesan per detik untuk setiap chat
+CHAT_EDIT_INTERVAL = 1.0
+
+
+class FakeBotApi(BaseRequest):
+    """Bot API lokal: menjawab method yang dipakai handler dan mencatat setiap panggilan."""
+
+    def __init__(self, latency: float = 0.03):
+        self.latency = latency
+        self.files = {}
+        self.calls = Counter()
+        self.upload_bytes = 0
+        self.edit_times = []
+        self.chat_edits = Counter()
+        self.chat_edit_violations = 0
+        self.error_replies = Counter()
+        self._last_edit = {}
+        self._message_ids = defaultdict(int)
+
+    @property
+    def read_timeout(self):
+        return 5.0
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def next_message_id(self, chat_id) -> int:
+        self._message_ids[chat_id] += 1
+        return self._message_ids[chat_id]
+
+    def _message(self, chat_id, message_id=None, text=""):
+        return {
+            "message_id": message_id or self.next_message_id(chat_id),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": BOT_USER,
+            "text": text
+        }
+
+    async def do_request(self, url, method, request_data=None, *args, **kwargs):
+        name = url.rsplit("/", 1)[-1]
+        if method == "GET" and name in self.files:
+            # Unduhan file (foto / dokumen) yang dikirim pengguna simulasi
+            self.calls["download"] += 1
+            return 200, self.files[name]
+
+        await asyncio.sleep(self.latency)
+        self.calls[name] += 1
+        params = request_data.parameters if request_data else {}
+        chat_id = params.get("chat_id")
+
+        if name == "getMe":
+            result = BOT_USER
+        elif name == "getFile":
+            file_id = params["file_id"]
+            result = {"file_id": file_id, "file_unique_id": file_id, "file_size": len(self.files[file_id]),
+                      "file_path": f"files/{file_id}"}
+        elif name in ("sendMessage", "sendDocument", "sendAudio"):
+            text = params.get("text", "")
+            if text.startswith(("🔥", "❌", "⚠️")):
+                self.error_replies[chat_id] += 1
+            if request_data and name != "sendMessage":
+                for part in request_data.multipart_data.values():
+                    if isinstance(part[1], bytes):
+                        self.upload_bytes += len(part[1])
+            result = self._message(chat_id, text=text)
+        elif name == "editMessageText":
+            now = time.monotonic()
+            last = self._last_edit.get(chat_id)
+            if last is not None and now - last < CHAT_EDIT_INTERVAL:
+                self.chat_edit_violations += 1
+            self._last_edit[chat_id] = now
+            self.edit_times.append(now)
+            self.chat_edits[chat_id] += 1
+            result = self._message(chat_id, params.get("message_id"), params.get("text", ""))
+        else:
+            # deleteMessage, answerCallbackQuery, sendChatAction
+            result = True
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+
+
+# ------------------------------------------------------------------------------
+# UPDATE SINTETIS
+# ------------------------------------------------------------------------------
+
+class SimulatedUser:
+    def __init__(self, user_id, api, bot):
+        self.user_id = user_id
+        self.api = api
+        self.bot = bot
+        self._update_id = 0
+
+    def _user(self):
+        return {"id": self.user_id, "is_bot": False, "first_name": f"User{self.user_id}"}
+
+    def _build(self, payload):
+        self._update_id += 1
+        return Update.de_json({"update_id": self.user_id * 1000 + self._update_id, **payload}, self.bot)
+
+    def message(self, **fields):
+        message_id = self.api.next_message_id(self.user_id)
+        payload = {
+            "message_id": message_id, "date": int(time.time()),
+            "chat": {"id": self.user_id, "type": "private"}, "from": self._user(), **fields
+        }
+        return message_id, self._build({"message": payload})
+
+    def text(self, text):
+        return self.message(text=text)
+
+    def command(self, command):
+        return self.message(text=command, entities=[{"type": "bot_command", "offset": 0, "length": len(command)}])
+
+    def photo(self, data):
+        file_id = f"photo{self.user_id}_{self._update_id}"
+        self.api.files[file_id] = data
+        return self.message(photo=[{"file_id": file_id, "file_unique_id": file_id,
+                                    "width": 2400, "height": 3200, "file_size": len(data)}])
+
+    def document(self, data, filename):
+        file_id = f"doc{self.user_id}_{self._update_id}"
+        self.api.files[file_id] = data
+        return self.message(document={"file_id": file_id, "file_unique_id": file_id,
+                                      "file_name": filename, "file_size": len(data)})
+
+    def click(self, data):
+        return self._build({"callback_query": {
+            "id": f"{self.user_id}{self._update_id}", "from": self._user(), "chat_instance": str(self.user_id),
+            "data": data, "message": self.api._message(self.user_id)
+        }})
+
+
+def flow_summarize_tts(user, inputs):
+    msg_id, update = user.text(inputs["text"])
+    yield "kirim_teks", update
+    yield "rangkum", user.click(f"sum_{msg_id}")
+    yield "pilih_bahasa", user.click(f"lang_id_tts_{msg_id}")
+    yield "tts", user.click(f"proc_id_tts_female_{msg_id}")
+
+
+def flow_translate(user, inputs):
+    _, update = user.command("/translate")
+    yield "mode", update
+    msg_id, update = user.text(inputs["text"])
+    yield "kirim_teks", update
+    yield "terjemah", user.click(f"lang_en_trans_{msg_id}")
+
+
+def flow_ocr(user, inputs):
+    msg_id, update = user.photo(inputs["image"])
+    yield "ocr", update
+    yield "pilih_bahasa", user.click(f"lang_id_tts_{msg_id}")
+    yield "tts", user.click(f"proc_en_tts_male_{msg_id}")
+
+
+def flow_document(user, inputs):
+    msg_id, update = user.document(inputs["pdf"], "materi.pdf")
+    yield "ekstrak", update
+    yield "rangkum", user.click(f"sum_{msg_id}")
+
+
+FLOWS = {
+    "summarize_tts": flow_summarize_tts,
+    "translate": flow_translate,
+    "ocr": flow_ocr,
+    "document": flow_document,
+}
+
+
+# ------------------------------------------------------------------------------
+# RUNNER
+# ------------------------------------------------------------------------------
+
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except OSError:
+        # Bukan Linux: pakai puncak RSS
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def sample_memory(api, state, interval, samples):
+    start = time.monotonic()
+    while True:
+        samples.append({
+            "t": round(time.monotonic() - start, 1),
+            "rss_mb": round(rss_mb(), 1),
+            "active": state["active"],
+            "done": state["done"],
+            "edits": api.calls["editMessageText"],
+            "session_bytes": sessions.session_store.stats()["bytes"]
+        })
+        await asyncio.sleep(interval)
+
+
+class UpdateTracker:
+    """Menandai update selesai diproses: handler di grup terakhir berjalan setelah semua handler bot."""
+
+    GROUP = 1000
+
+    def __init__(self, app):
+        self._pending = {}
+        app.add_handler(TypeHandler(Update, self._done), group=self.GROUP)
+
+    async def _done(self, update, context):
+        future = self._pending.pop(update.update_id, None)
+        if future and not future.done():
+            future.set_result(None)
+
+    async def process(self, app, update):
+        # Lewat antrean + fetcher PTB, jadi batas concurrent_updates produksi ikut terukur
+        future = asyncio.get_running_loop().create_future()
+        self._pending[update.update_id] = future
+        await app.update_queue.put(update)
+        await future
+
+
+async def run_user(app, tracker, api, user_id, flow_name, inputs, delay, think, state, results):
+    await asyncio.sleep(delay)
+    user = SimulatedUser(user_id, api, app.bot)
+    state["active"] += 1
+    errors_before = api.error_replies[user_id]
+    edits_before = api.chat_edits[user_id]
+    busy = 0.0
+    step_times = {}
+    try:
+        for step, update in FLOWS[flow_name](user, inputs):
+            start = time.perf_counter()
+            await tracker.process(app, update)
+            step_times[step] = time.perf_counter() - start
+            busy += step_times[step]
+            await asyncio.sleep(think)
+    finally:
+        state["active"] -= 1
+        state["done"] += 1
+    results.append({
+        "flow": flow_name,
+        "seconds": busy,
+        "steps": step_times,
+        "error": api.error_replies[user_id] > errors_before,
+        "edits": api.chat_edits[user_id] - edits_before
+    })
+
+
+def parse_mix(text):
+    mix = []
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name not in FLOWS:
+            raise ValueError(f"Alur tidak dikenal: {name} (pilihan: {', '.join(FLOWS)})")
+        mix.extend([name] * int(weight or 1))
+    return mix
+
+
+async def run(args):
+    api = FakeBotApi(latency=args.api_latency)
+    app = main.build_application(api, api)
+    tracker = UpdateTracker(app)
+    await jobs.job_queue.start()
+    await app.initialize()
+    await app.start()
+
+    shared = {
+        "text": fixtures.make_text(args.text_words),
+        "image": fixtures.make_image(),
+        "pdf": fixtures.make_pdf(pages=args.pdf_pages)
+    }
+
+    def inputs_for(i):
+        if args.shared_inputs:
+            # Semua pengguna mengirim materi yang sama (mis. satu kelas dengan handout yang sama)
+            return shared
+        return {
+            "text": fixtures.make_text(args.text_words, seed=i),
+            "image": shared["image"] + i.to_bytes(4, "big"),
+            "pdf": shared["pdf"]
+        }
+
+    mix = parse_mix(args.mix)
+    state = {"active": 0, "done": 0}
+    results, samples = [], []
+    sampler = asyncio.create_task(sample_memory(api, state, args.sample_interval, samples))
+
+    start = time.monotonic()
+    tasks = [
+        run_user(app, tracker, api, 100000 + i, mix[i % len(mix)], inputs_for(i),
+                 args.ramp * i / max(1, args.users), args.think, state, results)
+        for i in range(args.users)
+    ]
+    outcomes = await asyncio.gather(*tasks, return_exceptions=True)
+    wall = time.monotonic() - start
+    sampler.cancel()
+
+    await app.stop()
+    await app.shutdown()
+    await jobs.job_queue.stop()
+    main.services.shutdown_workers()
+    report(api, results, samples, wall, [o for o in outcomes if isinstance(o, Exception)])
+
+
+def report(api, results, samples, wall, crashes):
+    print(f"\n=== {len(results)} alur selesai dalam {wall:.1f} detik ({len(crashes)} crash harness) ===")
+    by_flow = defaultdict(list)
+    for row in results:
+        by_flow[row["flow"]].append(row)
+    print(f"{'alur':<15}{'n':>6}{'p50 s':>9}{'p95 s':>9}{'p99 s':>9}{'error':>7}{'edit/alur':>11}")
+    for name, rows in by_flow.items():
+        latencies = sorted(r["seconds"] for r in rows)
+        print(f"{name:<15}{len(rows):>6}{percentile(latencies, 50):>9.2f}{percentile(latencies, 95):>9.2f}"
+              f"{percentile(latencies, 99):>9.2f}{sum(r['error'] for r in rows):>7}"
+              f"{sum(r['edits'] for r in rows) / len(rows):>11.1f}")
+        steps = defaultdict(list)
+        for r in rows:
+            for step, seconds in r["steps"].items():
+                steps[step].append(seconds)
+        for step, values in steps.items():
+            values.sort()
+            print(f"  - {step:<13}{'':>6}{percentile(values, 50):>9.2f}{percentile(values, 95):>9.2f}"
+                  f"{percentile(values, 99):>9.2f}")
+
+    per_second = Counter(int(t) for t in api.edit_times)
+    print("\nBot API:", dict(api.calls.most_common()))
+    print(f"editMessageText total {len(api.edit_times)} | puncak {max(per_second.values(), default=0)}/detik | "
+          f"edit < {CHAT_EDIT_INTERVAL:.0f} dtk di chat yang sama: {api.chat_edit_violations} | "
+          f"upload {api.upload_bytes / 1024 / 1024:.1f} MB")
+    print(f"Panggilan palsu: {fakes.settings.calls}")
+
+    print("\nMemori (RSS) selama pengujian:")
+    step = max(1, len(samples) // 20)
+    for sample in samples[::step] + ([samples[-1]] if samples and (len(samples) - 1) % step else []):
+        print(f"  t={sample['t']:>7}s  rss {sample['rss_mb']:>8.1f} MB  aktif {sample['active']:>5}  "
+              f"selesai {sample['done']:>6}  edit {sample['edits']:>7}  sesi {sample['session_bytes'] / 1024:>8.0f} KB")
+    for crash in crashes[:5]:
+        print(f"CRASH: {crash!r}")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--ramp", type=float, default=30, help="Detik sampai semua pengguna mulai")
+    parser.add_argument("--mix", default="summarize_tts=4,translate=3,ocr=2,document=1")
+    parser.add_argument("--think", type=float, default=0.5, help="Jeda antar langkah pengguna (detik)")
+    parser.add_argument("--text-words", type=int, default=400)
+    parser.add_argument("--pdf-pages", type=int, default=10)
+    parser.add_argument("--shared-inputs", action="store_true", help="Semua pengguna mengirim teks/foto yang sama")
+    parser.add_argument("--api-latency", type=float, default=0.03, help="Latensi Bot API palsu (detik)")
+    parser.add_argument("--gemini-latency", type=float, default=0.5)
+    parser.add_argument("--gemini-429-rate", type=float, default=0.0)
+    parser.add_argument("--tts-latency", type=float, default=0.3)
+    parser.add_argument("--sample-interval", type=float, default=1.0)
+    args = parser.parse_args()
+
+    fakes.install(fakes.FakeSettings(
+        gemini_latency=args.gemini_latency,
+        gemini_429_rate=args.gemini_429_rate,
+        tts_latency=args.tts_latency
+    ))
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -1,27 +1,159 @@
 import os
 from dotenv import load_dotenv
-from typing import Final, Dict
+from typing import Final, Dict, List
 
 # Memuat file .env
 load_dotenv()
 
 # --- KREDENSIAL  ---
 TOKEN: Final[str] = os.getenv("TELEGRAM_TOKEN", "")
-GEMINI_API_KEY: Final[str] = os.getenv("GEMINI_API_KEY", "")
+# Beberapa key dipisah koma (GEMINI_API_KEYS) untuk menambah kuota; GEMINI_API_KEY tetap didukung
+GEMINI_API_KEYS: Final[List[str]] = (
+    [k.strip() for k in os.getenv("GEMINI_API_KEYS", "").split(",") if k.strip()]
+    or [k for k in [os.getenv("GEMINI_API_KEY", "").strip()] if k]
+)
+GEMINI_API_KEY: Final[str] = GEMINI_API_KEYS[0] if GEMINI_API_KEYS else ""
 
 if not TOKEN or not GEMINI_API_KEY:
     missing = []
     if not TOKEN:
         missing.append("TELEGRAM_TOKEN")
     if not GEMINI_API_KEY:
-        missing.append("GEMINI_API_KEY")
+        missing.append("GEMINI_API_KEY / GEMINI_API_KEYS")
     raise ValueError(f"ERROR: Kredensial berikut belum diisi di file .env atau environment: {', '.join(missing)}")
 
+# --- PENGATURAN SERVER & PENERIMAAN UPDATE ---
+# "polling" (default, hanya 1 worker) atau "webhook" (update dikirim Telegram ke FastAPI)
+BOT_MODE: Final[str] = os.getenv("BOT_MODE", "polling").lower()
+# URL publik server, mis. https://svaraai.example.com (wajib untuk mode webhook)
+WEBHOOK_URL: Final[str] = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_PATH: Final[str] = os.getenv("WEBHOOK_PATH", "/telegram/webhook")
+WEBHOOK_SECRET: Final[str] = os.getenv("WEBHOOK_SECRET", "")
+# Koneksi paralel maksimal dari Telegram ke webhook
+WEBHOOK_MAX_CONNECTIONS: Final[int] = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", 40))
+# Batas antrean update per worker; saat penuh Telegram diminta mengirim ulang
+UPDATE_QUEUE_SIZE: Final[int] = int(os.getenv("UPDATE_QUEUE_SIZE", 1000))
+# Jumlah update yang diproses bersamaan per worker (mode polling & webhook)
+UPDATE_WORKERS: Final[int] = int(os.getenv("UPDATE_WORKERS", 16))
+# Jumlah proses uvicorn (mode polling selalu 1)
+WEB_WORKERS: Final[int] = int(os.getenv("WEB_WORKERS", 1))
+
+# Muat backend (Gemini, edge-tts, PIL, PyPDF2) di background setelah server siap
+WARMUP: Final[bool] = os.getenv("WARMUP", "true").lower() == "true"
+
+if BOT_MODE not in ("polling", "webhook"):
+    raise ValueError(f"ERROR: BOT_MODE harus 'polling' atau 'webhook', bukan '{BOT_MODE}'")
+if BOT_MODE == "webhook" and not WEBHOOK_URL:
+    raise ValueError("ERROR: WEBHOOK_URL wajib diisi untuk BOT_MODE=webhook")
+
 # --- PENGATURAN APLIKASI ---
 MAX_CHARS: Final[int] = 50000
 CHUNK_SIZE: Final[int] = 2500
+# Batas byte UTF-8 per chunk TTS (edge-tts memecah sendiri di atas ~4096 byte, di tengah kalimat)
+TTS_CHUNK_BYTES: Final[int] = 4000
 MAX_WORDS_IN_CHAT: Final[int] = 300
 MAX_FILE_SIZE_MB: Final[int] = 20
+# Buffer unduhan dokumen tetap di memori sampai ukuran ini, baru pindah ke disk
+SPOOL_MAX_MB: Final[int] = int(os.getenv("SPOOL_MAX_MB", 5))
+
+# --- PENGATURAN OCR ---
+# Sisi terpanjang gambar sebelum dikirim ke Gemini (0 = tidak diperkecil)
+OCR_MAX_DIMENSION: Final[int] = int(os.getenv("OCR_MAX_DIMENSION", 2048))
+OCR_GRAYSCALE: Final[bool] = os.getenv("OCR_GRAYSCALE", "false").lower() == "true"
+OCR_JPEG_QUALITY: Final[int] = int(os.getenv("OCR_JPEG_QUALITY", 85))
+# Jumlah gambar per request Gemini saat OCR banyak gambar (album / multi upload)
+OCR_BATCH_SIZE: Final[int] = int(os.getenv("OCR_BATCH_SIZE", 5))
+
+# --- PENGATURAN BATCH API (/api/batch/*) ---
+BATCH_MAX_ITEMS: Final[int] = int(os.getenv("BATCH_MAX_ITEMS", 1000))
+# Jumlah item batch yang diproses bersamaan di server
+BATCH_CONCURRENCY: Final[int] = int(os.getenv("BATCH_CONCURRENCY", 8))
+# Batas ukuran body request batch (MB)
+BATCH_MAX_UPLOAD_MB: Final[int] = int(os.getenv("BATCH_MAX_UPLOAD_MB", 100))
+
+# --- PENGATURAN JOB QUEUE (/api/jobs) ---
+JOB_DB: Final[str] = os.getenv("JOB_DB", "jobs.db")
+# Folder file input & hasil job (audio)
+JOB_DIR: Final[str] = os.getenv("JOB_DIR", "jobs")
+JOB_WORKERS: Final[int] = int(os.getenv("JOB_WORKERS", 2))
+# Worker terpisah untuk job dari bot (interaktif) agar tidak antre di belakang job /api/jobs
+JOB_INTERACTIVE_WORKERS: Final[int] = int(os.getenv("JOB_INTERACTIVE_WORKERS", 8))
+# Job selesai/gagal (baris DB + file input & audio) dihapus setelah sekian detik
+JOB_RETENTION: Final[int] = int(os.getenv("JOB_RETENTION", 86400))
+
+# --- PENGATURAN PROGRESS BAR TELEGRAM ---
+# Jarak minimal antar edit progress bar di satu chat (detik)
+PROGRESS_CHAT_INTERVAL: Final[float] = float(os.getenv("PROGRESS_CHAT_INTERVAL", 2.0))
+# Batas edit progress bar per detik untuk seluruh bot
+PROGRESS_GLOBAL_RATE: Final[float] = float(os.getenv("PROGRESS_GLOBAL_RATE", 20))
+# Seberapa sering event progres digabung & dikirim (detik)
+PROGRESS_TICK: Final[float] = float(os.getenv("PROGRESS_TICK", 0.5))
+# Tombol inline yang sama di chat yang sama diabaikan selama diproses dan sampai sekian detik setelahnya
+CALLBACK_DEBOUNCE: Final[float] = float(os.getenv("CALLBACK_DEBOUNCE", 2.0))
+
+# --- PENGATURAN SESI (teks per pesan yang menunggu tombol) ---
+# Budget byte per pengguna dan total; entri paling lama tidak dipakai dibuang lebih dulu
+SESSION_USER_MAX_MB: Final[int] = int(os.getenv("SESSION_USER_MAX_MB", 4))
+SESSION_MAX_MB: Final[int] = int(os.getenv("SESSION_MAX_MB", 256))
+SESSION_TTL: Final[int] = int(os.getenv("SESSION_TTL", 21600))  # detik (0 = tanpa TTL)
+# Entri yang tidak diakses selama ini dikompres (0 = tanpa kompresi)
+SESSION_COMPRESS_AFTER: Final[int] = int(os.getenv("SESSION_COMPRESS_AFTER", 300))
+# Path file SQLite agar sesi bertahan saat restart / dipakai bersama antar worker (kosong = memori)
+SESSION_DB: Final[str] = os.getenv("SESSION_DB", "")
+
+# --- PENGATURAN RINGKASAN DOKUMEN PANJANG (map-reduce) ---
+# Teks di atas MAX_CHARS tetap diterima untuk diringkas sampai batas ini
+MAX_SUMMARY_CHARS: Final[int] = int(os.getenv("MAX_SUMMARY_CHARS", 500000))
+# Ukuran maksimal tiap bagian yang dikirim ke Gemini
+SUMMARY_SECTION_CHARS: Final[int] = int(os.getenv("SUMMARY_SECTION_CHARS", 20000))
+# Jumlah bagian yang diringkas bersamaan
+SUMMARY_WORKERS: Final[int] = int(os.getenv("SUMMARY_WORKERS", 4))
+
+# --- PENGATURAN TERJEMAHAN PER SEGMEN ---
+# Batas teks per request terjemahan (tiap TRANSLATE_SEGMENT_CHARS = satu panggilan Gemini)
+MAX_TRANSLATE_CHARS: Final[int] = int(os.getenv("MAX_TRANSLATE_CHARS", 200000))
+TRANSLATE_SEGMENT_CHARS: Final[int] = int(os.getenv("TRANSLATE_SEGMENT_CHARS", 4000))
+TRANSLATE_WORKERS: Final[int] = int(os.getenv("TRANSLATE_WORKERS", 4))
+# Berapa kali segmen yang gagal diulang
+TRANSLATE_SEGMENT_RETRIES: Final[int] = int(os.getenv("TRANSLATE_SEGMENT_RETRIES", 2))
+# Terjemah + TTS berjalan bertumpuk: segmen yang sudah diterjemahkan langsung disintesis
+TRANSLATE_TTS_PIPELINE: Final[bool] = os.getenv("TRANSLATE_TTS_PIPELINE", "true").lower() == "true"
+
+# --- PENGATURAN EKSTRAKSI PDF ---
+# Jumlah proses untuk ekstraksi PDF besar (1 = tanpa process pool)
+PDF_WORKERS: Final[int] = int(os.getenv("PDF_WORKERS", 2))
+# PDF dengan halaman sebanyak ini atau lebih diekstrak paralel
+PDF_PARALLEL_MIN_PAGES: Final[int] = int(os.getenv("PDF_PARALLEL_MIN_PAGES", 60))
+PDF_PAGES_PER_TASK: Final[int] = int(os.getenv("PDF_PAGES_PER_TASK", 20))
+
+# --- PENGATURAN GEMINI ---
+# Jumlah maksimal request Gemini yang berjalan bersamaan
+GEMINI_CONCURRENCY: Final[int] = int(os.getenv("GEMINI_CONCURRENCY", 4))
+# Batas request per menit per model untuk SETIAP key (0 = tanpa batas, hanya cooldown saat 429)
+GEMINI_RPM_PRIMARY: Final[int] = int(os.getenv("GEMINI_RPM_PRIMARY", 0))
+GEMINI_RPM_BACKUP: Final[int] = int(os.getenv("GEMINI_RPM_BACKUP", 0))
+# Batas atas cooldown setelah 429 berturut-turut (detik)
+GEMINI_MAX_BACKOFF: Final[float] = float(os.getenv("GEMINI_MAX_BACKOFF", 60))
+# Setelah 429 berturut-turut sebanyak ini, key diistirahatkan selama GEMINI_KEY_COOLDOWN detik
+GEMINI_KEY_MAX_429: Final[int] = int(os.getenv("GEMINI_KEY_MAX_429", 3))
+GEMINI_KEY_COOLDOWN: Final[float] = float(os.getenv("GEMINI_KEY_COOLDOWN", 60))
+# Request yang menunggu selama ini naik satu kelas prioritas (0 = tanpa aging)
+GEMINI_PRIORITY_AGING: Final[float] = float(os.getenv("GEMINI_PRIORITY_AGING", 30))
+
+# --- PENGATURAN TTS ---
+# Jumlah chunk edge-tts yang disintesis bersamaan (turunkan jika kena throttling)
+TTS_CONCURRENCY: Final[int] = int(os.getenv("TTS_CONCURRENCY", 4))
+
+# --- PENGATURAN CACHE HASIL (OCR / Ringkasan / Terjemahan) ---
+RESULT_CACHE_MAX_ITEMS: Final[int] = int(os.getenv("RESULT_CACHE_MAX_ITEMS", 512))
+RESULT_CACHE_TTL: Final[int] = int(os.getenv("RESULT_CACHE_TTL", 86400))  # detik
+# Path file SQLite untuk cache di disk (kosong = hanya cache memori)
+RESULT_CACHE_DB: Final[str] = os.getenv("RESULT_CACHE_DB", "")
+
+# --- PENGATURAN CACHE AUDIO TTS (per chunk) ---
+TTS_CACHE_DIR: Final[str] = os.getenv("TTS_CACHE_DIR", "tts_cache")
+# Batas ukuran cache audio di disk dalam MB (0 = nonaktif)
+TTS_CACHE_MAX_MB: Final[int] = int(os.getenv("TTS_CACHE_MAX_MB", 200))
 
 # --- MAPPING BAHASA UNTUK TTS ---
 VOICE_MAPPING: Final[Dict[str, Dict[str, str]]] = {
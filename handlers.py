@@ -1,12 +1,18 @@
 import os
 import asyncio
+import tempfile
 import logging
-import random
+import inspect
+import functools
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 from telegram.constants import ChatAction
 import config
 import services
+import jobs
+import sessions
+import metrics
+import progress
 
 logger = logging.getLogger(__name__)
 
@@ -14,28 +20,29 @@ logger = logging.getLogger(__name__)
 # 1. LOADING BAR HELPER
 # ==============================================================================
 
+def _accepts_progress(task_function):
+    return 'progress_callback' in inspect.signature(task_function).parameters
+
 async def processing_with_bar(context, message, prefix_text, task_function, *args):
-    loop = asyncio.get_running_loop()
-    future = loop.run_in_executor(None, task_function, *args)
-    percent = 0
-    while not future.done():
-        if percent < 90:
-            increment = random.randint(5, 15)
-            percent = min(percent + increment, 90)
-        bar_len = 10
-        filled = int((percent / 100) * bar_len)
-        bar = "█" * filled + "░" * (bar_len - filled)
-        try:
-            await message.edit_text(f"{prefix_text}\n`[{bar}] {percent}%`", parse_mode='Markdown')
-        except: pass
-        await asyncio.sleep(1.5)
-    result = await future
+    """
+    Jalankan task_function sambil menampilkan progress bar dari progres nyata yang dilaporkannya.
+    Edit pesan diatur progress_service (digabung & dibatasi per chat / global), pesan status dihapus di akhir.
+    """
+    tracker = progress.progress_service.track(message, prefix_text)
     try:
-        await message.edit_text(f"{prefix_text}\n`[██████████] 100%`", parse_mode='Markdown')
-        await asyncio.sleep(0.5)
-        await message.delete() 
-    except: pass
-    return result
+        if asyncio.iscoroutinefunction(task_function):
+            # Fungsi async (Gemini) jalan langsung di event loop
+            if _accepts_progress(task_function):
+                return await task_function(*args, progress_callback=tracker)
+            return await task_function(*args)
+        # Fungsi sinkron (ekstraksi dokumen) jalan di thread; progres dilaporkan lewat tracker.update
+        if _accepts_progress(task_function):
+            call = functools.partial(task_function, *args, progress_callback=tracker.update)
+        else:
+            call = functools.partial(task_function, *args)
+        return await asyncio.get_running_loop().run_in_executor(None, call)
+    finally:
+        await tracker.close()
 
 # ==============================================================================
 # 2. KEYBOARD MANAGERS
@@ -93,11 +100,7 @@ async def send_text_result(message, text, title=""):
     if title:
         await message.reply_text(f"📝 **{title}** | {stats}:", parse_mode='Markdown')
     if w_count > config.MAX_WORDS_IN_CHAT:
-        fname = "hasil_teks.txt"
-        with open(fname, 'w', encoding='utf-8') as f: f.write(text)
-        await message.reply_document(open(fname, 'rb'), caption=f"📄 Isi Teks Lengkap {stats}")
-        try: os.remove(fname)
-        except: pass
+        await message.reply_document(text.encode('utf-8'), filename="hasil_teks.txt", caption=f"📄 Isi Teks Lengkap {stats}")
     else:
         await message.reply_text(text)
 
@@ -105,6 +108,14 @@ async def show_main_menu(message, text=""):
     msg = text if text else "🤖 **Menu Utama SvaraAI**\nSilakan pilih mode atau kirim file:"
     await message.reply_text(msg, reply_markup=get_main_menu_keyboard(), parse_mode='Markdown')
     
+async def save_text(update_obj, data_id, text):
+    """Simpan teks per pesan di session store (dibatasi budget & TTL, bukan di context.user_data)."""
+    await sessions.session_store.put(update_obj.effective_user.id, data_id, text)
+
+async def load_text(update_obj, data_id):
+    """None jika teks sudah kedaluwarsa atau tergusur dari session store."""
+    return await sessions.session_store.get(update_obj.effective_user.id, data_id)
+
 def get_language_name(lang_code):
     """Mengembalikan nama bahasa lengkap."""
     lang_map = {
@@ -142,22 +153,56 @@ async def cmd_translate(u, c): await set_mode(u, c, 'translate')
 async def cmd_tts(u, c): await set_mode(u, c, 'auto')
 async def cmd_stop(u, c):
     c.user_data.clear()
+    await sessions.session_store.clear(u.effective_user.id)
     await u.message.reply_text("🛑 Bot Dihentikan. Ketik /start untuk mulai.")
 
 # ==============================================================================
 # 5. INPUT PROCESSING
 # ==============================================================================
 
+# Foto dalam satu album (media group) datang sebagai update terpisah:
+# dikumpulkan sebentar lalu di-OCR sekaligus
+MEDIA_GROUP_WAIT = 1.5
+# Album yang sudah dijadwalkan di proses ini (fotonya sendiri ada di session store, dibagi antar worker)
+_media_group_tasks = set()
+
+async def collect_media_group(update, context, photo):
+    group_id = update.message.media_group_id
+    await sessions.session_store.add_media(group_id, update.message.message_id, photo.file_id)
+    if group_id not in _media_group_tasks:
+        _media_group_tasks.add(group_id)
+        context.application.create_task(process_media_group(group_id, update, context))
+
+async def process_media_group(group_id, update, context):
+    # Tunggu sampai tidak ada foto baru; hanya satu worker yang berhasil mengambil seluruh foto album
+    try:
+        file_ids = None
+        while file_ids is None:
+            await asyncio.sleep(MEDIA_GROUP_WAIT)
+            file_ids = await sessions.session_store.take_media(group_id, MEDIA_GROUP_WAIT)
+    finally:
+        _media_group_tasks.discard(group_id)
+    if not file_ids: return
+
+    await context.bot.send_chat_action(chat_id=update.effective_chat.id, action=ChatAction.TYPING)
+    files = await asyncio.gather(*(context.bot.get_file(file_id) for file_id in file_ids))
+    images = await asyncio.gather(*(f.download_as_bytearray() for f in files))
+    prefix = f"⏳ **Memindai {len(images)} Gambar (OCR)**"
+    status = await update.message.reply_text(f"{prefix}\n`[░░░░░░░░░░] 0%`", parse_mode='Markdown')
+    texts = await processing_with_bar(context, status, prefix, services.ocr_batch, [bytes(b) for b in images])
+    await handle_text_result(update, context, "\n\n".join(t for t in texts if t))
+
 async def handle_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user_id = update.effective_user.id
-    msg_id = update.message.message_id
+    # Pengguna bot mendapat prioritas tertinggi di penjadwal kuota Gemini
+    services.gemini_priority.set(services.PRIORITY_INTERACTIVE)
     text_result = ""
-    current_mode = context.user_data.get('mode', 'auto')
 
     if update.message.photo:
         photo = update.message.photo[-1]
         if (photo.file_size/1024/1024) > config.MAX_FILE_SIZE_MB:
             await update.message.reply_text("❌ Foto terlalu besar."); return
+        if update.message.media_group_id:
+            await collect_media_group(update, context, photo); return
         await context.bot.send_chat_action(chat_id=update.effective_chat.id, action=ChatAction.TYPING)
         file = await photo.get_file()
         bytes_data = await file.download_as_bytearray()
@@ -168,27 +213,40 @@ async def handle_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
         doc = update.message.document
         ext = os.path.splitext(doc.file_name)[1].lower()
         if ext not in ['.pdf', '.docx', '.txt']: await update.message.reply_text("❌ Format salah."); return
+        if doc.file_size and (doc.file_size/1024/1024) > config.MAX_FILE_SIZE_MB:
+            await update.message.reply_text("❌ File terlalu besar."); return
         status = await update.message.reply_text("⏳ **Membaca Dokumen**\n`[░░░░░░░░░░] 0%`", parse_mode='Markdown')
         f = await doc.get_file()
-        path = f"temp_{doc.file_unique_id}{ext}"
-        await f.download_to_drive(path)
-        text_result = await processing_with_bar(context, status, "⏳ **Membaca Dokumen**", services.extract_document_content, path)
-        if os.path.exists(path): os.remove(path)
+        # Unduh ke buffer memori (baru pindah ke disk jika melewati SPOOL_MAX_MB)
+        with tempfile.SpooledTemporaryFile(max_size=config.SPOOL_MAX_MB * 1024 * 1024) as buffer:
+            await f.download_to_memory(buffer)
+            text_result = await processing_with_bar(context, status, "⏳ **Membaca Dokumen**", services.extract_document_content, buffer, config.MAX_SUMMARY_CHARS, doc.file_name)
 
     elif update.message.text:
         text_result = update.message.text
 
+    await handle_text_result(update, context, text_result)
+
+async def handle_text_result(update: Update, context: ContextTypes.DEFAULT_TYPE, text_result: str):
+    msg_id = update.message.message_id
+    current_mode = context.user_data.get('mode', 'auto')
+
     if text_result:
-        if len(text_result) > config.MAX_CHARS:
-             await update.message.reply_text(f"❌ Teks kepanjangan (Max {config.MAX_CHARS})."); return
+        # Teks di atas MAX_CHARS hanya bisa diringkas (map-reduce)
+        is_long = len(text_result) > config.MAX_CHARS
+        if is_long and (current_mode == 'translate' or len(text_result) > config.MAX_SUMMARY_CHARS):
+            limit = config.MAX_CHARS if current_mode == 'translate' else config.MAX_SUMMARY_CHARS
+            await update.message.reply_text(f"❌ Teks kepanjangan (Max {limit})."); return
 
-        context.user_data[f'text_{msg_id}'] = text_result
+        await save_text(update, msg_id, text_result)
         w_count = len(text_result.split())
         c_count = len(text_result)
         stats = f"{w_count} kata"
         await update.message.reply_text(f"📊 **Input Diterima** | {stats}", parse_mode='Markdown')
 
-        if current_mode == 'summarize':
+        if current_mode == 'summarize' or is_long:
+            if is_long:
+                await update.message.reply_text("📚 Dokumen panjang, diringkas per bagian terlebih dahulu.")
             await execute_summarize(update, context, msg_id, text_result)
         elif current_mode == 'translate':
             await update.message.reply_text("🌐 Pilih Bahasa Terjemahan:", reply_markup=create_lang_kb(msg_id, 'trans'))
@@ -208,11 +266,12 @@ async def handle_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def execute_summarize(update_obj, context, data_id, raw_text, is_final=False):
     message = update_obj.message if update_obj.message else update_obj.callback_query.message
     status = await message.reply_text("⏳ **Sedang Meringkas...**\n`[░░░░░░░░░░] 0%`", parse_mode='Markdown')
+    # Dokumen panjang melaporkan progres per bagian yang selesai diringkas
     summary = await processing_with_bar(context, status, "⏳ **Sedang Meringkas...**", services.summarize_text, raw_text)
     
     if summary.startswith("⚠️"): await message.reply_text(summary); return
 
-    context.user_data[f'text_{data_id}'] = summary 
+    await save_text(update_obj, data_id, summary)
     await send_text_result(message, summary, "Hasil Ringkasan")
     
     current_mode = context.user_data.get('mode', 'auto')
@@ -227,15 +286,17 @@ async def execute_summarize(update_obj, context, data_id, raw_text, is_final=Fal
 
 async def execute_translate_only(update_obj, context, data_id, lang_code, is_final=False):
     message = update_obj.message if update_obj.message else update_obj.callback_query.message
-    text_source = context.user_data.get(f'text_{data_id}')
+    text_source = await load_text(update_obj, data_id)
     if not text_source: await message.reply_text("⚠️ Data expired."); return
     
     lang_name = get_language_name(lang_code)
 
     status = await message.reply_text(f"📝 **Menerjemahkan ke Bahasa {lang_name}**\n`[░░░░░░░░░░] 0%`", parse_mode='Markdown')
-    final_text = await processing_with_bar(context, status, f"📝 **Menerjemahkan ke Bahasa {lang_name}**", services.translate_text, text_source, lang_code)
+    prefix = f"📝 **Menerjemahkan ke Bahasa {lang_name}**"
+    # Teks panjang diterjemahkan per segmen: progres nyata per segmen
+    final_text = await processing_with_bar(context, status, prefix, services.translate_text, text_source, lang_code)
     
-    context.user_data[f'text_{data_id}'] = final_text 
+    await save_text(update_obj, data_id, final_text)
     await send_text_result(message, final_text, f"Hasil Terjemahan Bahasa {lang_name}")
     
     current_mode = context.user_data.get('mode', 'auto')
@@ -256,12 +317,27 @@ async def execute_translate_only(update_obj, context, data_id, lang_code, is_fin
 # ==============================================================================
 
 async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    chat_id = update.effective_chat.id if update.effective_chat else update.effective_user.id
+    # Status tombol ada di session store (SESSION_DB) agar tekan ganda yang sampai di worker lain ikut tertahan
+    if not await sessions.session_store.claim_callback(chat_id, query.data, config.CALLBACK_DEBOUNCE):
+        try: await query.answer("⏳ Masih diproses...")
+        except: pass
+        return
+    try:
+        await handle_callback(update, context)
+    finally:
+        await sessions.session_store.finish_callback(chat_id, query.data)
+
+async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    services.gemini_priority.set(services.PRIORITY_INTERACTIVE)
     query = update.callback_query
     await query.answer()
     data = query.data
     
     if data == 'stop_bot':
         context.user_data.clear()
+        await sessions.session_store.clear(update.effective_user.id)
         try: await query.message.delete()
         except: pass
         
@@ -270,6 +346,7 @@ async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     if data == 'done':
         context.user_data.clear()
+        await sessions.session_store.clear(update.effective_user.id)
         context.user_data['mode'] = 'auto'
         try: await query.message.delete()
         except: pass
@@ -289,7 +366,7 @@ async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     if data.startswith('deep_sum_'):
         data_id = data.split('_')[2]
-        raw_text = context.user_data.get(f'text_{data_id}')
+        raw_text = await load_text(update, data_id)
         if not raw_text: await query.edit_message_text("⚠️ Data Expired."); return
         await execute_summarize(update, context, data_id, raw_text, is_final=True)
         return
@@ -313,7 +390,7 @@ async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     if action == 'sum':
         data_id = parts[1]
-        raw = context.user_data.get(f'text_{data_id}')
+        raw = await load_text(update, data_id)
         if not raw: await query.edit_message_text("⚠️ Data Expired."); return
         await execute_summarize(update, context, data_id, raw, is_final=False)
 
@@ -343,46 +420,55 @@ async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
         lang_name = get_language_name(lang)
         
-        text_source = context.user_data.get(f'text_{data_id}')
+        text_source = await load_text(update, data_id)
         if not text_source: await query.edit_message_text("⚠️ Expired."); return
 
-        status_trans = await query.edit_message_text(f"📝 **Menerjemahkan Audio ke Bahasa {lang_name}**\n`[░░░░░░░░░░] 0%`", parse_mode='Markdown')
-        final_text = await processing_with_bar(context, status_trans, f"📝 **Menerjemahkan Audio ke Bahasa {lang_name}**", services.translate_text, text_source, lang)
-        
-        status_audio = await query.message.reply_text(f"⏳ **Memproses Audio  Bahasa {lang_name}**\n`[░░░░░░░░░░] 0%`", parse_mode='Markdown')
-        
-        async def progress_cb(cur, tot):
-            if cur%2==0 or cur==tot:
-                try: 
-                    pct = int((cur/tot)*100)
-                    bar = "█"*int(pct/10) + "░"*(10-int(pct/10))
-                    await status_audio.edit_text(f"⏳ **Memproses Audio Bahasa {lang_name}**\n`[{bar}] {pct}%`", parse_mode='Markdown')
-                except: pass
-
+        if config.TRANSLATE_TTS_PIPELINE:
+            # Terjemah + TTS dalam satu job: audio segmen awal dibuat sambil segmen berikutnya diterjemahkan
+            steps, job_text = ['translate', 'tts'], text_source
+            prefix = f"🎧 **Menerjemahkan & Memproses Audio Bahasa {lang_name}**"
+            status_audio = await query.edit_message_text(f"{prefix}\n`[░░░░░░░░░░] 0%`", parse_mode='Markdown')
+        else:
+            status_trans = await query.edit_message_text(f"📝 **Menerjemahkan Audio ke Bahasa {lang_name}**\n`[░░░░░░░░░░] 0%`", parse_mode='Markdown')
+            prefix = f"📝 **Menerjemahkan Audio ke Bahasa {lang_name}**"
+            job_text = await processing_with_bar(context, status_trans, prefix, services.translate_text, text_source, lang)
+            steps = ['tts']
+            prefix = f"⏳ **Memproses Audio Bahasa {lang_name}**"
+            status_audio = await query.message.reply_text(f"{prefix}\n`[░░░░░░░░░░] 0%`", parse_mode='Markdown')
+        tracker = progress.progress_service.track(status_audio, prefix)
+
+        job_id = None
         try:
-            audio_path = await services.generate_audio_long(
-                final_text, lang, gender, f"{query.from_user.id}_{data_id}", progress_cb
+            # Lewat antrean job bersama (worker pool yang sama dengan /api/jobs)
+            job_id = await jobs.job_queue.submit(
+                steps, job_text, options={'target_lang': lang, 'lang': lang, 'gender': gender, 'strict': False}
             )
-            if not audio_path: await query.message.reply_text("❌ Gagal Audio."); return
+            job = await jobs.job_queue.wait(job_id, tracker)
+            await tracker.close()
+            if not job or job['status'] != 'done': await query.message.reply_text("❌ Gagal Audio."); return
             
-            await status_audio.delete()
+            final_text = job['result_text']
             w_count = len(final_text.split())
-            await query.message.reply_audio(
-                audio=open(audio_path, 'rb'), 
-                caption=f"🎧 Audio: {lang_name} | {gender.title()}\n📊 {w_count} kata"
-            )
+            with open(job['result_path'], 'rb') as audio_file:
+                await query.message.reply_audio(
+                    audio=audio_file, 
+                    caption=f"🎧 Audio: {lang_name} | {gender.title()}\n📊 {w_count} kata"
+                )
             
             if final_text.strip() != text_source.strip():
                 await send_text_result(query.message, final_text, f"Teks Audio Bahasa {lang_name}")
 
-            if os.path.exists(audio_path): os.remove(audio_path)
             await query.message.reply_text("Selesai.", reply_markup=create_finish_kb(data_id))
 
         except Exception as e:
             await query.message.reply_text(f"Error: {e}")
+        finally:
+            if not tracker.closed: await tracker.close()
+            if job_id: await jobs.job_queue.discard(job_id)
 
 async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE):
     print(f"Error: {context.error}")
+    metrics.bot_errors.inc()
     try:
         if isinstance(update, Update) and update.effective_message:
             await update.effective_message.reply_text(f"🔥 Error: {context.error}")
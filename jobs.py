@@ -0,0 +1,384 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+import sqlite3
+import threading
+import config
+import services
+import metrics
+
+# Urutan langkah pipeline yang valid: input (ocr/extract) -> teks -> audio
+JOB_STEPS = ('ocr', 'extract', 'summarize', 'translate', 'tts')
+INPUT_STEPS = ('ocr', 'extract')
+# Dengan beberapa proses, job 'running' baru dianggap yatim jika tidak ada progres selama ini (detik)
+JOB_STALE_AFTER = 600
+# Interval pembersihan job yang melewati JOB_RETENTION (detik)
+JOB_SWEEP_INTERVAL = 600
+# wait() mengecek status di database tiap interval ini, untuk job yang dijalankan proses lain (detik)
+JOB_POLL_INTERVAL = 2
+# Batas default wait() menunggu satu job (detik)
+JOB_WAIT_TIMEOUT = 1800
+
+class JobStore:
+    """Penyimpanan status job di SQLite agar antrean tidak hilang saat restart."""
+
+    def __init__(self, db_path: str):
+        self._db = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._db.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, steps TEXT NOT NULL, options TEXT NOT NULL, "
+            "input_text TEXT, input_path TEXT, input_name TEXT, "
+            "status TEXT NOT NULL, progress REAL NOT NULL DEFAULT 0, "
+            "result_text TEXT, result_path TEXT, error TEXT, "
+            "created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._db.commit()
+
+    @staticmethod
+    def _to_dict(row):
+        if row is None:
+            return None
+        job = dict(row)
+        job['steps'] = json.loads(job['steps'])
+        job['options'] = json.loads(job['options'])
+        return job
+
+    def insert(self, job: dict):
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO jobs (id, steps, options, input_text, input_path, input_name, status, progress, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, 0, ?, ?)",
+                (job['id'], json.dumps(job['steps']), json.dumps(job['options']), job['input_text'],
+                 job['input_path'], job['input_name'], job['status'], job['created_at'], job['created_at'])
+            )
+            self._db.commit()
+
+    def update(self, job_id: str, **fields):
+        fields['updated_at'] = time.time()
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._db.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+            self._db.commit()
+
+    def claim(self, job_id: str) -> bool:
+        """Tandai job 'running' secara atomik; False jika sudah diambil worker/proses lain."""
+        with self._lock:
+            cursor = self._db.execute(
+                "UPDATE jobs SET status = 'running', progress = 0, updated_at = ? WHERE id = ? AND status = 'queued'",
+                (time.time(), job_id)
+            )
+            self._db.commit()
+        return cursor.rowcount == 1
+
+    def get(self, job_id: str):
+        with self._lock:
+            row = self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row)
+
+    def delete(self, job_id: str):
+        with self._lock:
+            self._db.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+            self._db.commit()
+
+    def expired(self, before: float) -> list:
+        """Job selesai/gagal yang terakhir diubah sebelum waktu tersebut."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, input_path, result_path FROM jobs WHERE status IN ('done', 'failed') AND updated_at < ?",
+                (before,)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def unfinished(self) -> list:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT * FROM jobs WHERE status IN ('queued', 'running') ORDER BY created_at"
+            ).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+class JobQueue:
+    """Antrean job OCR/ringkas/terjemah/TTS dengan worker pool, dipakai bersama oleh API dan bot."""
+
+    def __init__(self, db_path: str, job_dir: str, workers: int, interactive_workers: int):
+        self.db_path = db_path
+        self.job_dir = job_dir
+        self.workers = workers
+        self.interactive_workers = interactive_workers
+        self.store = None
+        # Job bot hanya disimpan di memori proses ini: tidak diambil proses lain, tidak dijalankan ulang
+        # setelah restart (tidak ada lagi yang menunggu), dan teks pengguna tidak tertulis ke jobs.db
+        self.local_store = None
+        self._local = set()
+        self._queue = None
+        self._interactive = None
+        self._seq = 0
+        self._tasks = []
+        self._waiters = {}
+        self._listeners = {}
+
+    async def start(self):
+        os.makedirs(self.job_dir, exist_ok=True)
+        self.store = JobStore(self.db_path)
+        self.local_store = JobStore(":memory:")
+        # Job API/batch diurutkan menurut prioritas; job bot punya jalur & worker sendiri
+        self._queue = asyncio.PriorityQueue()
+        self._interactive = asyncio.Queue()
+        # Job yang belum selesai sebelum restart dimasukkan lagi ke antrean
+        for job in self.store.unfinished():
+            if job['options'].get('priority') == services.PRIORITY_INTERACTIVE:
+                # Job bot dari versi lama yang tersimpan di jobs.db: penunggunya sudah tidak ada
+                self._remove(job)
+                continue
+            if job['status'] == 'running' and config.WEB_WORKERS > 1 and time.time() - job['updated_at'] < JOB_STALE_AFTER:
+                continue
+            if job['status'] == 'running':
+                self.store.update(job['id'], status='queued', progress=0)
+            self._enqueue(job['id'], job['options'])
+        self._tasks = [asyncio.create_task(self._worker(self._queue)) for _ in range(self.workers)]
+        self._tasks += [
+            asyncio.create_task(self._worker(self._interactive)) for _ in range(self.interactive_workers)
+        ]
+        self._tasks.append(asyncio.create_task(self._sweeper()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    @staticmethod
+    def validate_steps(steps: list, has_text: bool, has_file: bool):
+        if not steps:
+            raise ValueError("Langkah job kosong.")
+        for step in steps:
+            if step not in JOB_STEPS:
+                raise ValueError(f"Langkah tidak dikenal: {step}")
+        if any(step in INPUT_STEPS for step in steps[1:]):
+            raise ValueError("Langkah ocr/extract hanya boleh di awal.")
+        if 'tts' in steps[:-1]:
+            raise ValueError("Langkah tts harus di akhir.")
+        if steps[0] in INPUT_STEPS and not has_file:
+            raise ValueError(f"Langkah {steps[0]} membutuhkan file.")
+        if steps[0] not in INPUT_STEPS and not has_text:
+            raise ValueError("Job membutuhkan teks.")
+
+    async def submit(self, steps: list, text: str = None, file_bytes: bytes = None, filename: str = "",
+                     options: dict = None) -> str:
+        self.validate_steps(steps, bool(text), file_bytes is not None)
+        # Job dari bot ikut kelas interaktif, selain itu kelas API
+        options = dict(options or {})
+        options.setdefault('priority', services.gemini_priority.get())
+        job_id = uuid.uuid4().hex
+        input_path = None
+        if file_bytes is not None:
+            ext = os.path.splitext(filename)[1].lower()
+            input_path = os.path.join(self.job_dir, f"{job_id}.input{ext}")
+            await asyncio.to_thread(_write_file, input_path, file_bytes)
+        job = {
+            'id': job_id, 'steps': steps, 'options': options,
+            'input_text': text, 'input_path': input_path, 'input_name': filename,
+            'status': 'queued', 'created_at': time.time()
+        }
+        if options['priority'] == services.PRIORITY_INTERACTIVE:
+            self._local.add(job_id)
+        await asyncio.to_thread(self._store(job_id).insert, job)
+        self._enqueue(job_id, options)
+        return job_id
+
+    def _store(self, job_id: str) -> JobStore:
+        return self.local_store if job_id in self._local else self.store
+
+    def _enqueue(self, job_id: str, options: dict):
+        priority = options.get('priority', services.PRIORITY_API)
+        if priority == services.PRIORITY_INTERACTIVE:
+            self._interactive.put_nowait(job_id)
+        else:
+            # seq menjaga urutan FIFO di antara job dengan prioritas sama
+            self._seq += 1
+            self._queue.put_nowait((priority, self._seq, job_id))
+
+    async def get(self, job_id: str):
+        return await asyncio.to_thread(self._store(job_id).get, job_id)
+
+    def queue_depth(self) -> int:
+        if self._queue is None:
+            return 0
+        return self._queue.qsize() + self._interactive.qsize()
+
+    async def wait(self, job_id: str, progress_callback=None, timeout: float = JOB_WAIT_TIMEOUT) -> dict:
+        """Tunggu job selesai (paling lama timeout detik). progress_callback(persen, 100) dipanggil saat progres berubah.
+
+        Jika waktu habis, job dikembalikan dengan status terakhirnya (queued/running).
+        """
+        job = await self.get(job_id)
+        if job is None or job['status'] in ('done', 'failed'):
+            return job
+        future = self._waiters.setdefault(job_id, asyncio.get_running_loop().create_future())
+        if progress_callback:
+            self._listeners.setdefault(job_id, []).append(progress_callback)
+        deadline = time.monotonic() + timeout
+        try:
+            while not future.done():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    await asyncio.wait_for(asyncio.shield(future), min(JOB_POLL_INTERVAL, remaining))
+                except asyncio.TimeoutError:
+                    # Job API bisa diambil proses lain yang berbagi jobs.db: selesainya hanya terlihat di database
+                    job = await self.get(job_id)
+                    if job is None or job['status'] in ('done', 'failed'):
+                        return job
+        finally:
+            if progress_callback and job_id in self._listeners:
+                self._listeners[job_id].remove(progress_callback)
+            if not future.done() and self._waiters.get(job_id) is future and not self._listeners.get(job_id):
+                del self._waiters[job_id]
+        return await self.get(job_id)
+
+    async def discard(self, job_id: str):
+        """Hapus job yang sudah selesai beserta file input/hasilnya."""
+        job = await self.get(job_id)
+        if job is None:
+            return
+        await asyncio.to_thread(self._remove, job)
+
+    def _remove(self, job: dict):
+        for path in (job['input_path'], job['result_path']):
+            if path and os.path.exists(path):
+                try: os.remove(path)
+                except OSError: pass
+        self._store(job['id']).delete(job['id'])
+        self._local.discard(job['id'])
+
+    def sweep(self) -> int:
+        """Hapus job selesai/gagal yang lebih tua dari JOB_RETENTION (termasuk job bot yang tidak lagi ditunggu)."""
+        before = time.time() - config.JOB_RETENTION
+        expired = self.store.expired(before) + self.local_store.expired(before)
+        for job in expired:
+            self._remove(job)
+        return len(expired)
+
+    async def _sweeper(self):
+        while True:
+            try:
+                removed = await asyncio.to_thread(self.sweep)
+                if removed:
+                    print(f"Job: {removed} job lama dihapus.")
+            except Exception as e:
+                print(f"Error Sweep Job: {e}")
+            await asyncio.sleep(JOB_SWEEP_INTERVAL)
+
+    async def _worker(self, queue):
+        while True:
+            item = await queue.get()
+            job_id = item[-1] if isinstance(item, tuple) else item
+            try:
+                # Beberapa proses uvicorn bisa berbagi jobs.db: hanya satu yang boleh menjalankan job
+                if await asyncio.to_thread(self._store(job_id).claim, job_id):
+                    await self._run(await self.get(job_id))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error Job {job_id}: {e}")
+            finally:
+                queue.task_done()
+
+    async def _set_progress(self, job_id: str, progress: float, last: dict):
+        percent = int(progress * 100)
+        if percent == last.get('percent'):
+            return
+        last['percent'] = percent
+        await asyncio.to_thread(self._store(job_id).update, job_id, progress=progress)
+        for callback in list(self._listeners.get(job_id, [])):
+            try: await callback(percent, 100)
+            except Exception: pass
+
+    async def _run(self, job: dict):
+        job_id = job['id']
+        store = self._store(job_id)
+        services.gemini_priority.set(job['options'].get('priority', services.PRIORITY_API))
+        try:
+            result_text, result_path = await self._run_pipeline(job)
+            await asyncio.to_thread(
+                store.update, job_id, status='done', progress=1.0,
+                result_text=result_text, result_path=result_path
+            )
+        except Exception as e:
+            await asyncio.to_thread(store.update, job_id, status='failed', error=str(e))
+        finally:
+            future = self._waiters.pop(job_id, None)
+            if future and not future.done():
+                future.set_result(None)
+            self._listeners.pop(job_id, None)
+
+    async def _run_pipeline(self, job: dict):
+        steps = job['steps']
+        options = job['options']
+        text = job['input_text']
+        result_path = None
+        last = {}
+
+        for i, step in enumerate(steps):
+            async def progress(cur, tot, i=i):
+                await self._set_progress(job['id'], (i + (cur / tot if tot else 1)) / len(steps), last)
+
+            if step == 'ocr':
+                data = await asyncio.to_thread(_read_file, job['input_path'])
+                text = await services.ocr_with_gemini(data)
+                if not text or text == services.OCR_FAILED:
+                    raise services.ServiceError("Gagal membaca gambar.")
+            elif step == 'extract':
+                text = await asyncio.to_thread(
+                    services.extract_document_content, job['input_path'], config.MAX_SUMMARY_CHARS, job['input_name']
+                )
+                if not text:
+                    raise services.ServiceError("File kosong atau tidak terbaca.")
+            elif step == 'summarize':
+                text = await services.summarize_text(text, progress, strict=True)
+            elif step == 'translate' and steps[i + 1:i + 2] == ['tts'] and config.TRANSLATE_TTS_PIPELINE:
+                # Terjemah + TTS digabung: segmen yang sudah diterjemahkan langsung disintesis
+                async def pipeline_progress(cur, tot, progress=progress):
+                    await progress(2 * cur, tot)
+
+                text, audio_path = await services.translate_to_audio(
+                    text, options.get('target_lang', 'en'), options.get('lang', 'id'), options.get('gender', 'female'),
+                    f"job_{job['id']}",
+                    pipeline_progress, strict=options.get('strict', True)
+                )
+                if not audio_path:
+                    raise services.ServiceError("Gagal generate audio.")
+                result_path = os.path.join(self.job_dir, f"{job['id']}.mp3")
+                os.replace(audio_path, result_path)
+                continue  # progres sudah dilaporkan untuk kedua langkah
+            elif step == 'translate':
+                text = await services.translate_text(text, options.get('target_lang', 'en'), progress, strict=True)
+            elif step == 'tts' and result_path:
+                continue  # audio sudah dibuat bersama terjemahan
+            elif step == 'tts':
+                audio_path = await services.generate_audio_long(
+                    text, options.get('lang', 'id'), options.get('gender', 'female'), f"job_{job['id']}", progress
+                )
+                if not audio_path:
+                    raise services.ServiceError("Gagal generate audio.")
+                result_path = os.path.join(self.job_dir, f"{job['id']}.mp3")
+                os.replace(audio_path, result_path)
+            await progress(1, 1)
+
+        return text, result_path
+
+def _write_file(path: str, data: bytes):
+    with open(path, 'wb') as f:
+        f.write(data)
+
+def _read_file(path: str) -> bytes:
+    with open(path, 'rb') as f:
+        return f.read()
+
+job_queue = JobQueue(config.JOB_DB, config.JOB_DIR, config.JOB_WORKERS, config.JOB_INTERACTIVE_WORKERS)
+metrics.queue_depth.set_function(job_queue.queue_depth, queue="jobs")
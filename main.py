@@ -1,17 +1,32 @@
+import startup  # paling awal: titik nol laporan waktu startup
 import logging
 import os
-import uvicorn
-import glob
-from fastapi import FastAPI
-from fastapi.responses import RedirectResponse
+import time
+import asyncio
 from contextlib import asynccontextmanager
-from telegram.ext import ApplicationBuilder, CommandHandler, MessageHandler, CallbackQueryHandler, filters
-from telegram.request import HTTPXRequest  # <--- IMPORT PENTING
+
+# Biaya import tiap modul dicatat; backend berat (Gemini, edge-tts, PIL, PyPDF2) baru dimuat saat dipakai
+with startup.report.measure("import fastapi + uvicorn"):
+    import uvicorn
+    from fastapi import FastAPI
+    from fastapi.responses import RedirectResponse, PlainTextResponse, JSONResponse
+with startup.report.measure("import telegram"):
+    from telegram.ext import ApplicationBuilder, CommandHandler, MessageHandler, CallbackQueryHandler, filters
+    from telegram.request import HTTPXRequest  # <--- IMPORT PENTING
 
 # Import Modul
-import config
-import handlers
-import api.routes
+with startup.report.measure("import config"):
+    import config
+with startup.report.measure("import services"):
+    import services
+with startup.report.measure("import handlers + jobs"):
+    import handlers
+    import jobs
+    import metrics
+with startup.report.measure("import api"):
+    import api.routes
+    import api.webhook
+    from api.middleware import UploadLimitMiddleware, MetricsMiddleware
 
 # --- SETUP LOGGING ---
 logging.basicConfig(
@@ -21,51 +36,130 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # --- KONFIGURASI REQUEST ---
-t_request = HTTPXRequest(
-    connection_pool_size=8,
-    read_timeout=600.0,  
-    write_timeout=600.0, 
-    connect_timeout=60.0
-)
+class InstrumentedHTTPXRequest(HTTPXRequest):
+    """HTTPXRequest yang mencatat durasi tiap method Bot API (editMessageText, sendAudio, dst.) ke /metrics."""
+
+    async def do_request(self, url, method, *args, **kwargs):
+        api_method = url.rsplit("/", 1)[-1]
+        metrics.telegram_inflight.inc()
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            code, payload = await super().do_request(url, method, *args, **kwargs)
+            outcome = str(code)
+            return code, payload
+        finally:
+            metrics.telegram_inflight.dec()
+            metrics.telegram_seconds.observe(time.perf_counter() - start, method=api_method, outcome=outcome)
+
+with startup.report.measure("create HTTPXRequest"):
+    t_request = InstrumentedHTTPXRequest(
+        connection_pool_size=8,
+        read_timeout=600.0,  
+        write_timeout=600.0, 
+        connect_timeout=60.0
+    )
 
 # --- SETUP BOT TELEGRAM ---
-bot_app = ApplicationBuilder().token(config.TOKEN).request(t_request).build()
+def register_handlers(application):
+    application.add_handler(CommandHandler("start", handlers.start))
+    application.add_handler(CommandHandler("summarize", handlers.cmd_summarize))
+    application.add_handler(CommandHandler("translate", handlers.cmd_translate))
+    application.add_handler(CommandHandler("stop", handlers.cmd_stop))
 
-# Register Command
-bot_app.add_handler(CommandHandler("start", handlers.start))
-bot_app.add_handler(CommandHandler("summarize", handlers.cmd_summarize))
-bot_app.add_handler(CommandHandler("translate", handlers.cmd_translate))
-bot_app.add_handler(CommandHandler("stop", handlers.cmd_stop))
+    application.add_error_handler(handlers.error_handler)
+    input_filter = (filters.PHOTO) | (filters.Document.ALL) | (filters.TEXT & ~filters.COMMAND)
+    application.add_handler(MessageHandler(input_filter, handlers.handle_input))
+    application.add_handler(CallbackQueryHandler(handlers.callback_handler))
 
-bot_app.add_error_handler(handlers.error_handler)
-input_filter = (filters.PHOTO) | (filters.Document.ALL) | (filters.TEXT & ~filters.COMMAND)
-bot_app.add_handler(MessageHandler(input_filter, handlers.handle_input))
-bot_app.add_handler(CallbackQueryHandler(handlers.callback_handler))
+def build_application(request, get_updates_request=None):
+    # Dipakai juga oleh bench/telegram_load.py agar Application di benchmark sama dengan produksi
+    builder = ApplicationBuilder().token(config.TOKEN).request(request)
+    if get_updates_request is not None:
+        builder = builder.get_updates_request(get_updates_request)
+    # Tanpa concurrent_updates, fetcher PTB (mode polling) memproses update satu per satu:
+    # satu rangkuman / TTS yang lama menahan semua chat lain
+    application = builder.concurrent_updates(config.UPDATE_WORKERS).build()
+    register_handlers(application)
+    return application
+
+with startup.report.measure("build bot_app"):
+    bot_app = build_application(t_request)
+
+for phase in startup.report.phases:
+    metrics.startup_seconds.set(phase["seconds"], phase=phase["phase"])
 
 # --- SETUP FASTAPI ---
+def cleanup_work_files():
+    # Berjalan di background setelah server menerima traffic: hanya file dari sebelum proses ini mulai,
+    # dan dengan beberapa worker, file milik worker lain yang masih diproses tidak boleh ikut terhapus
+    min_age = 600 if config.WEB_WORKERS > 1 else 0
+    now = time.time()
+    with os.scandir(".") as entries:
+        for entry in entries:
+            if not entry.name.endswith((".mp3", ".txt")) or entry.name == "requirements.txt":
+                continue
+            try:
+                mtime = entry.stat().st_mtime
+                if entry.is_file() and mtime < startup.PROCESS_START_TIME and now - mtime >= min_age:
+                    os.remove(entry.path)
+            except: pass
+
+async def run_in_background(name: str, fn):
+    # Pekerjaan yang tidak perlu selesai sebelum server siap (cleanup, warm-up)
+    try:
+        with startup.report.measure(name):
+            if asyncio.iscoroutinefunction(fn):
+                await fn()
+            else:
+                await asyncio.to_thread(fn)
+        metrics.startup_seconds.set(startup.report.phases[-1]["seconds"], phase=name)
+    except Exception as e:
+        logger.error(f"Gagal {name}: {e}")
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    logger.info("Membersihkan file sampah (.mp3 & .txt)...")
-    for file in glob.glob("*.mp3"):
-        try: os.remove(file)
-        except: pass
-    for file in glob.glob("*.txt"): 
-        if "requirements.txt" not in file: 
-            try: os.remove(file)
-            except: pass
+    logger.info(f"Server Start: Telegram Bot ({config.BOT_MODE}) + REST API")
+    loop = asyncio.get_running_loop()
+    metrics.queue_depth.set_function(
+        lambda: loop._default_executor._work_queue.qsize() if loop._default_executor else 0,
+        queue="thread_pool"
+    )
+    with startup.report.measure("start job queue"):
+        await jobs.job_queue.start()
+    with startup.report.measure("bot initialize"):
+        await bot_app.initialize()
+        await bot_app.start()
     
-    logger.info("Server Start: Telegram Bot + REST API")
-    await bot_app.initialize()
-    await bot_app.start()
-    
-    await bot_app.updater.start_polling(allowed_updates=["message", "callback_query"])
+    with startup.report.measure(f"start {config.BOT_MODE}"):
+        if config.BOT_MODE == "webhook":
+            await api.webhook.update_queue.start(bot_app)
+            await api.webhook.setup_webhook(bot_app.bot)
+        else:
+            await bot_app.updater.start_polling(allowed_updates=["message", "callback_query"])
+    startup.report.record("ready", 0.0)
+    logger.info(startup.report.summary())
+    for phase in startup.report.phases:
+        metrics.startup_seconds.set(phase["seconds"], phase=phase["phase"])
+
+    background = [asyncio.create_task(run_in_background("cleanup file sampah", cleanup_work_files))]
+    if config.WARMUP:
+        background.append(asyncio.create_task(run_in_background("warm-up backend", services.warm_up)))
     
     yield
     
+    for task in background:
+        task.cancel()
+    
     logger.info("Server Stop")
-    await bot_app.updater.stop()
+    if config.BOT_MODE == "webhook":
+        await api.webhook.update_queue.stop()
+    else:
+        await bot_app.updater.stop()
     await bot_app.stop()
     await bot_app.shutdown()
+    await jobs.job_queue.stop()
+    services.shutdown_workers()
 
 app = FastAPI(
     title="SvuaraAI Bot API",
@@ -81,7 +175,24 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+app.add_middleware(
+    UploadLimitMiddleware,
+    max_bytes=config.MAX_FILE_SIZE_MB * 1024 * 1024,
+    path_limits={"/api/batch/": config.BATCH_MAX_UPLOAD_MB * 1024 * 1024}
+)
+# Ditambahkan terakhir = paling luar, jadi request yang ditolak UploadLimit ikut tercatat
+app.add_middleware(MetricsMiddleware)
 app.include_router(api.routes.router)
+app.include_router(api.webhook.router)
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics_endpoint():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/startup", include_in_schema=False)
+async def startup_report():
+    # Termasuk pemuatan backend lazy yang terjadi setelah server siap
+    return JSONResponse(startup.report.as_dict())
 
 @app.get("/", include_in_schema=False)
 async def index():
@@ -90,4 +201,12 @@ async def index():
 if __name__ == "__main__":
     
     port = int(os.getenv("PORT", 8000))
-    uvicorn.run("main:app", host="0.0.0.0", port=port, reload=True)
\ No newline at end of file
+    reload = os.getenv("RELOAD", "false").lower() == "true"
+    # Polling dari beberapa proses akan saling berebut update, jadi hanya mode webhook yang boleh multi worker
+    workers = config.WEB_WORKERS if config.BOT_MODE == "webhook" and not reload else 1
+    if workers != config.WEB_WORKERS:
+        logger.warning(f"WEB_WORKERS={config.WEB_WORKERS} diabaikan (mode {config.BOT_MODE}, reload={reload}); memakai 1 worker.")
+    if workers > 1 and not config.SESSION_DB:
+        # Teks sesi, album foto, dan debounce tombol hanya terlihat oleh worker yang menerimanya
+        logger.warning(f"WEB_WORKERS={workers} tanpa SESSION_DB: sesi, album foto & debounce tombol tidak dibagi antar worker.")
+    uvicorn.run("main:app", host="0.0.0.0", port=port, reload=reload, workers=workers)
\ No newline at end of file
@@ -0,0 +1,180 @@
+import time
+import threading
+from contextlib import contextmanager
+
+# Metrik sederhana berformat teks Prometheus, tanpa dependensi atau layanan eksternal.
+# Aman dipakai dari event loop maupun thread (ekstraksi dokumen berjalan di thread/process pool).
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+_registry = []
+_lock = threading.Lock()
+
+def _label_key(labelnames, labels) -> tuple:
+    return tuple(str(labels.get(name, "")) for name in labelnames)
+
+def _format_labels(labelnames, values, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_value(value) -> str:
+    if value == float('inf'):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        _registry.append(self)
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_label_key(self.labelnames, labels), 0)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with _lock:
+            items = list(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+class Gauge:
+    """Nilai naik-turun; bisa juga dihitung saat /metrics dibaca lewat set_function()."""
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._functions = {}
+        _registry.append(self)
+
+    def set(self, value: float, **labels):
+        with _lock:
+            self._values[_label_key(self.labelnames, labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, fn, **labels):
+        self._functions[_label_key(self.labelnames, labels)] = fn
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        with _lock:
+            items = dict(self._values)
+        for key, fn in self._functions.items():
+            try:
+                items[key] = fn()
+            except Exception:
+                continue
+        for key, value in items.items():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self._series = {}  # label -> [jumlah per bucket, sum, count]
+        _registry.append(self)
+
+    def observe(self, value: float, **labels):
+        key = _label_key(self.labelnames, labels)
+        with _lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with _lock:
+            items = [(key, list(series[0]), series[1], series[2]) for key, series in self._series.items()]
+        for key, counts, total, count in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound if bound == float("inf") else float(bound))}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+@contextmanager
+def timer(histogram: Histogram, inflight: Gauge = None, **labels):
+    """Ukur durasi blok ke histogram (label 'outcome' diisi ok/error) dan hitung yang sedang berjalan."""
+    if inflight is not None:
+        inflight.inc(**{k: v for k, v in labels.items() if k in inflight.labelnames})
+    start = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        if 'outcome' in histogram.labelnames:
+            labels.setdefault('outcome', outcome)
+        histogram.observe(time.perf_counter() - start, **labels)
+        if inflight is not None:
+            inflight.dec(**{k: v for k, v in labels.items() if k in inflight.labelnames})
+
+def render() -> str:
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+# --- METRIK PER TAHAP ---
+gemini_seconds = Histogram("svara_gemini_request_seconds", "Durasi panggilan Gemini per model", ("model", "outcome"))
+gemini_inflight = Gauge("svara_gemini_inflight", "Panggilan Gemini yang sedang berjalan", ("model",))
+gemini_fallbacks = Counter("svara_gemini_fallback_total", "Pindah ke MODEL_BACKUP karena 404", ("model",))
+gemini_429 = Counter("svara_gemini_429_total", "Respons 429 / kuota habis dari Gemini", ("model",))
+
+tts_chunk_seconds = Histogram("svara_tts_chunk_seconds", "Durasi sintesis satu chunk edge-tts", ("outcome",))
+tts_inflight = Gauge("svara_tts_inflight", "Chunk TTS yang sedang disintesis")
+tts_retries = Counter("svara_tts_retries_total", "Pengulangan sintesis chunk TTS")
+
+singleflight_saved = Counter(
+    "svara_singleflight_saved_total", "Panggilan yang menumpang hasil panggilan identik yang sedang berjalan", ("operation",)
+)
+
+extract_seconds = Histogram("svara_extract_seconds", "Durasi ekstraksi dokumen", ("kind", "outcome"))
+
+telegram_seconds = Histogram("svara_telegram_request_seconds", "Durasi request ke Bot API Telegram", ("method", "outcome"))
+telegram_inflight = Gauge("svara_telegram_inflight", "Request Bot API yang sedang berjalan")
+bot_errors = Counter("svara_bot_errors_total", "Error yang sampai ke error_handler bot")
+progress_events = Counter("svara_progress_events_total", "Event progres nyata yang dilaporkan pipeline")
+progress_edits = Counter("svara_progress_edits_total", "Edit progress bar yang benar-benar dikirim ke Telegram")
+
+http_seconds = Histogram("svara_http_request_seconds", "Durasi request HTTP per route", ("method", "route", "status"))
+http_inflight = Gauge("svara_http_inflight", "Request HTTP yang sedang berjalan")
+
+startup_seconds = Gauge("svara_startup_seconds", "Durasi tiap fase startup (import, init, lazy load, warm-up)", ("phase",))
+queue_depth = Gauge("svara_queue_depth", "Jumlah tugas yang menunggu di antrean/executor", ("queue",))
@@ -0,0 +1,113 @@
+import time
+import asyncio
+import config
+import metrics
+
+# Semua progress bar bot lewat satu layanan: pipeline hanya melaporkan progres nyata (cur/tot),
+# layanan ini yang memutuskan kapan pesan benar-benar diedit agar Bot API tidak kebanjiran edit.
+
+NEVER = float('-inf')
+
+def render_bar(prefix_text, percent):
+    filled = int(percent / 10)
+    bar = "█" * filled + "░" * (10 - filled)
+    return f"{prefix_text}\n`[{bar}] {percent}%`"
+
+class ProgressTracker:
+    """Progress satu pesan status. Bisa dipanggil sebagai progress_callback async atau lewat update() dari thread."""
+
+    def __init__(self, service, message, prefix_text):
+        self.service = service
+        self.message = message
+        self.prefix_text = prefix_text
+        self.chat_id = message.chat_id
+        self.percent = 0
+        # Pesan status selalu dikirim dengan bar 0%
+        self.sent_text = render_bar(prefix_text, 0)
+        self.closed = False
+
+    def update(self, cur, tot):
+        percent = min(100, int((cur / tot) * 100)) if tot else 0
+        # Progres tidak pernah mundur (mis. langkah pipeline berikutnya mulai dari 0)
+        if percent > self.percent:
+            self.percent = percent
+            metrics.progress_events.inc()
+
+    async def __call__(self, cur, tot):
+        self.update(cur, tot)
+
+    def pending_text(self):
+        text = render_bar(self.prefix_text, self.percent)
+        return None if text == self.sent_text else text
+
+    async def close(self, delete: bool = True):
+        self.closed = True
+        self.service.discard(self)
+        if delete:
+            try: await self.message.delete()
+            except: pass
+
+class ProgressService:
+    """Gabungkan event progres dan kirim edit dengan batas per chat dan batas global (token bucket)."""
+
+    def __init__(self, chat_interval: float, global_rate: float, tick: float):
+        self.chat_interval = chat_interval
+        self.global_rate = global_rate
+        self.tick = tick
+        self._trackers = []
+        self._chat_last = {}
+        self._tokens = global_rate
+        self._refilled_at = time.monotonic()
+        self._task = None
+        self._edit_tasks = set()
+
+    def track(self, message, prefix_text) -> ProgressTracker:
+        tracker = ProgressTracker(self, message, prefix_text)
+        self._trackers.append(tracker)
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        return tracker
+
+    def discard(self, tracker):
+        if tracker in self._trackers:
+            self._trackers.remove(tracker)
+
+    def _refill(self, now):
+        self._tokens = min(self.global_rate, self._tokens + (now - self._refilled_at) * self.global_rate)
+        self._refilled_at = now
+
+    async def _run(self):
+        while self._trackers:
+            await asyncio.sleep(self.tick)
+            now = time.monotonic()
+            self._refill(now)
+            ready = [
+                t for t in self._trackers
+                if not t.closed and now - self._chat_last.get(t.chat_id, NEVER) >= self.chat_interval and t.pending_text()
+            ]
+            # Chat yang paling lama tidak diedit didahulukan saat token global terbatas
+            ready.sort(key=lambda t: self._chat_last.get(t.chat_id, NEVER))
+            for tracker in ready:
+                if self._tokens < 1:
+                    break
+                if now - self._chat_last.get(tracker.chat_id, NEVER) < self.chat_interval:
+                    continue  # chat yang sama sudah diedit oleh tracker lain di tick ini
+                self._tokens -= 1
+                self._chat_last[tracker.chat_id] = now
+                text = tracker.pending_text()
+                tracker.sent_text = text
+                # Edit dikirim di task terpisah agar Bot API yang lambat tidak menahan tick berikutnya
+                task = asyncio.create_task(self._edit(tracker, text))
+                self._edit_tasks.add(task)
+                task.add_done_callback(self._edit_tasks.discard)
+            # Riwayat chat yang sudah lewat interval tidak dibutuhkan lagi
+            if len(self._chat_last) > 4 * len(self._trackers) + 64:
+                self._chat_last = {c: t for c, t in self._chat_last.items() if now - t < self.chat_interval}
+
+    async def _edit(self, tracker, text):
+        metrics.progress_edits.inc()
+        try: await tracker.message.edit_text(text, parse_mode='Markdown')
+        except: pass
+
+progress_service = ProgressService(config.PROGRESS_CHAT_INTERVAL, config.PROGRESS_GLOBAL_RATE, config.PROGRESS_TICK)
+metrics.queue_depth.set_function(lambda: len(progress_service._trackers), queue="progress_bars")
@@ -0,0 +1,120 @@
+import re
+from bisect import bisect_right
+
+# Pemisah kalimat & paragraf untuk semua bahasa di LANG_NAMES (id, en, ja, ko, ar) dalam satu lintasan.
+# Hasilnya berupa offset (start, end) ke teks asli: TTS, terjemahan per segmen, dan ringkasan map-reduce
+# memakai segmentasi yang sama tanpa menyalin teks; potongan baru dibuat saat pemanggil mengiris text[start:end].
+
+# Tingkat batas, dari yang paling kuat
+PARAGRAPH = 3  # baris kosong
+SENTENCE = 2   # . ! ? … 。 ！ ？ ؟ ۔ dan baris baru
+CLAUSE = 1     # , ; : ، ؛ 、 ，
+WORD = 0       # spasi
+
+_CLOSERS = '"\'”’»)）\\]」』】'
+_BOUNDARY = re.compile(
+    r'(?P<para>\n(?:[ \t\r\f\v]*\n)+)'
+    r'|(?P<line>\n)'
+    # (?<!...) memastikan deretan tanda baca hanya dicoba dari karakter pertamanya (tetap linear)
+    rf'|(?P<sentence>(?<![.!?…؟۔])[.!?…؟۔]+[{_CLOSERS}]*(?=\s|$)|[。！？．]+[{_CLOSERS}]*)'
+    rf'|(?P<clause>(?<![,;:،؛])[,;:،؛]+[{_CLOSERS}]*(?=\s)|[、，；：]+)'
+)
+_LEVELS = {'para': PARAGRAPH, 'line': SENTENCE, 'sentence': SENTENCE, 'clause': CLAUSE}
+
+class Segmentation:
+    """Batas kalimat/paragraf sebuah teks. cuts[level] berisi posisi potong dengan tingkat >= level, terurut."""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.cuts = {PARAGRAPH: [], SENTENCE: [], CLAUSE: []}
+        for match in _BOUNDARY.finditer(text):
+            level = _LEVELS[match.lastgroup]
+            for lvl in range(CLAUSE, level + 1):
+                self.cuts[lvl].append(match.end())
+
+    def _trim(self, start: int, end: int):
+        text = self.text
+        while start < end and text[start].isspace():
+            start += 1
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        return (start, end) if start < end else None
+
+    def spans(self, level: int = SENTENCE) -> list:
+        """Offset tiap kalimat (level=SENTENCE) atau paragraf (level=PARAGRAPH), tanpa spasi di tepi."""
+        result = []
+        start = 0
+        for cut in self.cuts[level] + [len(self.text)]:
+            span = self._trim(start, cut)
+            if span:
+                result.append(span)
+            start = cut
+        return result
+
+    def _window_end(self, start: int, max_chars: int, max_bytes: int) -> int:
+        end = len(self.text) if max_chars is None else min(len(self.text), start + max_chars)
+        if max_bytes is not None:
+            # Tiap karakter minimal 1 byte, jadi cukup encode max_bytes karakter
+            end = min(end, start + max_bytes)
+            encoded = self.text[start:end].encode('utf-8')
+            if len(encoded) > max_bytes:
+                end = start + len(encoded[:max_bytes].decode('utf-8', 'ignore'))
+        return end
+
+    def _last_cut(self, level: int, lo: int, hi: int) -> int:
+        """Posisi potong terakhir dengan tingkat >= level di (lo, hi], atau -1."""
+        if level == WORD:
+            pos = max(self.text.rfind(' ', lo + 1, hi), self.text.rfind('　', lo + 1, hi))
+            return pos if pos > lo else -1
+        cuts = self.cuts[level]
+        i = bisect_right(cuts, hi) - 1
+        return cuts[i] if i >= 0 and cuts[i] > lo else -1
+
+    def _best_cut(self, lo: int, hi: int, prefer: int) -> int:
+        middle = lo + (hi - lo) // 2
+        # 1. Batas terkuat di paruh belakang jendela (potongan tetap penuh)
+        for level in range(prefer, SENTENCE - 1, -1):
+            pos = self._last_cut(level, middle, hi)
+            if pos > 0:
+                return pos
+        # 2. Kalimat utuh walau potongannya lebih pendek, 3. kalimat kepanjangan: koma, lalu spasi
+        for level in (SENTENCE, CLAUSE, WORD):
+            pos = self._last_cut(level, lo, hi)
+            if pos > 0:
+                return pos
+        # 4. Tidak ada batas sama sekali (mis. teks Jepang tanpa tanda baca): potong paksa
+        return hi
+
+    def pack(self, max_chars: int = None, max_bytes: int = None, prefer: int = PARAGRAPH) -> list:
+        """Gabungkan kalimat menjadi potongan <= max_chars karakter dan/atau <= max_bytes byte UTF-8."""
+        text = self.text
+        spans = []
+        start = 0
+        while start < len(text):
+            end = self._window_end(start, max_chars, max_bytes)
+            if end < len(text):
+                end = self._best_cut(start, max(end, start + 1), prefer)
+            span = self._trim(start, end)
+            if span:
+                spans.append(span)
+            start = end
+        return spans
+
+    def join(self, spans: list, parts: list) -> str:
+        """Susun ulang hasil per potongan (mis. terjemahan) dengan jenis pemisah dari teks asli."""
+        out = []
+        prev_end = None
+        for (start, end), part in zip(spans, parts):
+            if prev_end is not None:
+                gap = self.text[prev_end:start]
+                newlines = gap.count('\n')
+                out.append("\n\n" if newlines >= 2 else "\n" if newlines else " ")
+            out.append(part)
+            prev_end = end
+        return "".join(out)
+
+def segment(text: str) -> Segmentation:
+    return Segmentation(text or "")
+
+def pack(text: str, max_chars: int = None, max_bytes: int = None, prefer: int = PARAGRAPH) -> list:
+    return segment(text).pack(max_chars, max_bytes, prefer)
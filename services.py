@@ -1,16 +1,37 @@
 import os
 import time
-import google.generativeai as genai
-from PIL import Image
+import asyncio
 import io
-import edge_tts
-import PyPDF2
-import docx
+import codecs
+import shutil
+import tempfile
+import contextlib
+import contextvars
 import config
+import metrics
+import segmenter
+from startup import LazyModule
 import re
+import hashlib
+import zipfile
+import xml.etree.ElementTree as ET
+import sqlite3
+import threading
+import multiprocessing
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
 
-# --- SETUP GOOGLE GEMINI ---
-genai.configure(api_key=config.GEMINI_API_KEY)
+# --- BACKEND (dimuat saat pertama dipakai agar proses cepat siap menerima update) ---
+def _configure_genai(module):
+    module.configure(api_key=config.GEMINI_API_KEY)
+
+genai = LazyModule("google.generativeai", on_load=_configure_genai)
+glm = LazyModule("google.ai.generativelanguage")
+Image = LazyModule("PIL.Image")
+ImageOps = LazyModule("PIL.ImageOps")
+edge_tts = LazyModule("edge_tts")
+PyPDF2 = LazyModule("PyPDF2")
+BACKENDS = (genai, glm, Image, ImageOps, edge_tts, PyPDF2)
 
 MODEL_PRIMARY = 'gemini-2.5-flash'
 MODEL_BACKUP = 'gemini-2.0-flash'
@@ -19,14 +40,376 @@ LANG_NAMES = {
     'id': 'Indonesian', 'en': 'English', 'ja': 'Japanese', 'ko': 'Korean', 'ar': 'Arabic'
 }
 
-def model_backup(content, retries=3, delay=5):
+class ServiceError(Exception):
+    """Kegagalan layanan AI yang dilaporkan ke pemanggil (mis. item batch)."""
+
+# --- PENJADWAL KUOTA GEMINI ---
+# Kelas prioritas: bot interaktif > API biasa > batch
+PRIORITY_INTERACTIVE = 0
+PRIORITY_API = 1
+PRIORITY_BATCH = 2
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: 'interactive', PRIORITY_API: 'api', PRIORITY_BATCH: 'batch'}
+
+# Prioritas request Gemini untuk task yang sedang berjalan (diset oleh handler / route)
+gemini_priority = contextvars.ContextVar('gemini_priority', default=PRIORITY_API)
+
+class QuotaScheduler:
+    """
+    Pembagi slot request Gemini bersama: token bucket RPM per model, jeda bersama saat semua key kena 429,
+    batas concurrency global, dan antrean per kelas prioritas (FIFO di dalam kelas, dengan aging).
+    """
+
+    def __init__(self, model_rpm: dict, concurrency: int, aging_seconds: float):
+        self.concurrency = concurrency
+        self.aging_seconds = aging_seconds
+        self.in_flight = 0
+        self.granted = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self._models = {}
+        for name, rpm in model_rpm.items():
+            self._add_model(name, rpm)
+        self._timer = None
+
+    def _add_model(self, name: str, rpm: int = 0):
+        # Kapasitas bucket = kuota 15 detik, agar burst tidak menghabiskan jatah satu menit sekaligus
+        self._models[name] = {
+            'rpm': rpm,
+            'capacity': max(1.0, rpm / 4),
+            'tokens': max(1.0, rpm / 4),
+            'updated': time.monotonic(),
+            'cooldown_until': 0.0,
+            'waiting': {p: deque() for p in PRIORITY_NAMES}
+        }
+        return self._models[name]
+
+    def _state(self, name: str):
+        return self._models.get(name) or self._add_model(name)
+
+    def _refill(self, state, now):
+        if state['rpm'] > 0:
+            state['tokens'] = min(state['capacity'], state['tokens'] + (now - state['updated']) * state['rpm'] / 60)
+        state['updated'] = now
+
+    def _ready_at(self, state, now) -> float:
+        """Waktu paling cepat model bisa menerima request baru (now jika siap)."""
+        ready = max(now, state['cooldown_until'])
+        if state['rpm'] > 0 and state['tokens'] < 1:
+            ready = max(ready, now + (1 - state['tokens']) * 60 / state['rpm'])
+        return ready
+
+    def _next_entry(self, state, now):
+        # Pilih kepala antrean dengan prioritas efektif terbaik; menunggu lama menaikkan prioritas (aging)
+        best = None
+        for priority, queue in state['waiting'].items():
+            if not queue:
+                continue
+            waited = now - queue[0][0]
+            effective = priority - int(waited / self.aging_seconds) if self.aging_seconds > 0 else priority
+            key = (effective, queue[0][0])
+            if best is None or key < best[0]:
+                best = (key, queue)
+        return best[1] if best else None
+
+    def _dispatch(self):
+        self._timer = None
+        now = time.monotonic()
+        next_wake = None
+        for state in self._models.values():
+            self._refill(state, now)
+            while self.in_flight < self.concurrency:
+                queue = self._next_entry(state, now)
+                if queue is None:
+                    break
+                ready = self._ready_at(state, now)
+                if ready > now:
+                    next_wake = ready if next_wake is None else min(next_wake, ready)
+                    break
+                enqueued_at, future = queue.popleft()
+                if future.done():
+                    continue
+                if state['rpm'] > 0:
+                    state['tokens'] -= 1
+                self.in_flight += 1
+                waited = now - enqueued_at
+                self.granted += 1
+                self.total_wait += waited
+                self.max_wait = max(self.max_wait, waited)
+                future.set_result(None)
+        if next_wake is not None:
+            loop = asyncio.get_running_loop()
+            self._timer = loop.call_later(next_wake - now, self._dispatch)
+
+    def _schedule_dispatch(self):
+        if self._timer is not None:
+            self._timer.cancel()
+        self._dispatch()
+
+    @contextlib.asynccontextmanager
+    async def slot(self, model_name: str, priority: int = PRIORITY_API):
+        state = self._state(model_name)
+        future = asyncio.get_running_loop().create_future()
+        entry = (time.monotonic(), future)
+        state['waiting'][priority].append(entry)
+        self._schedule_dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Slot sudah diberikan tepat sebelum dibatalkan: kembalikan
+                self.in_flight -= 1
+                self._schedule_dispatch()
+            else:
+                try: state['waiting'][priority].remove(entry)
+                except ValueError: pass
+            raise
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._schedule_dispatch()
+
+    def pause(self, model_name: str, seconds: float):
+        """Tahan semua request model ini (mis. semua key sedang cooldown 429)."""
+        state = self._state(model_name)
+        state['cooldown_until'] = max(state['cooldown_until'], time.monotonic() + seconds)
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        queue_depth = {name: 0 for name in PRIORITY_NAMES.values()}
+        models = {}
+        for model_name, state in self._models.items():
+            self._refill(state, now)
+            for priority, queue in state['waiting'].items():
+                queue_depth[PRIORITY_NAMES[priority]] += len(queue)
+            models[model_name] = {
+                "rpm": state['rpm'],
+                "tokens": round(state['tokens'], 2) if state['rpm'] > 0 else None,
+                "cooldown_seconds": round(max(0.0, state['cooldown_until'] - now), 2),
+                "waiting": sum(len(q) for q in state['waiting'].values())
+            }
+        return {
+            "in_flight": self.in_flight,
+            "concurrency": self.concurrency,
+            "queue_depth": queue_depth,
+            "granted": self.granted,
+            "avg_wait_ms": round(self.total_wait / self.granted * 1000, 1) if self.granted else 0.0,
+            "max_wait_ms": round(self.max_wait * 1000, 1),
+            "models": models
+        }
+
+# RPM dihitung per key, jadi kapasitas total naik sebanding jumlah key
+quota_scheduler = QuotaScheduler(
+    {
+        MODEL_PRIMARY: config.GEMINI_RPM_PRIMARY * len(config.GEMINI_API_KEYS),
+        MODEL_BACKUP: config.GEMINI_RPM_BACKUP * len(config.GEMINI_API_KEYS)
+    },
+    config.GEMINI_CONCURRENCY,
+    config.GEMINI_PRIORITY_AGING
+)
+metrics.queue_depth.set_function(
+    lambda: sum(len(q) for state in quota_scheduler._models.values() for q in state['waiting'].values()),
+    queue="gemini_scheduler"
+)
+
+# --- POOL API KEY GEMINI ---
+class ApiKeyPool:
+    """
+    Beberapa API key Gemini, masing-masing dengan client & status kuota sendiri (per model).
+    Request diarahkan ke key sehat dengan beban paling kecil; key yang terus kena 429 diistirahatkan.
+    """
+
+    def __init__(self, api_keys: list):
+        self._keys = []
+        for i, api_key in enumerate(api_keys):
+            self._keys.append({
+                'index': i,
+                'label': f"key{i + 1}..{api_key[-4:]}",
+                'api_key': api_key,
+                'clients': None,
+                'in_flight': 0,
+                'requests': 0,
+                'errors_429': 0,
+                'models': {}
+            })
+
+    def _model_state(self, key, model_name: str):
+        state = key['models'].get(model_name)
+        if state is None:
+            state = {'cooldown_until': 0.0, 'backoff': 0.0, 'consecutive_429': 0}
+            key['models'][model_name] = state
+        return state
+
+    def acquire(self, model_name: str):
+        """Pilih key sehat dengan request berjalan paling sedikit (None jika semua sedang cooldown)."""
+        now = time.monotonic()
+        healthy = [k for k in self._keys if self._model_state(k, model_name)['cooldown_until'] <= now]
+        if not healthy:
+            return None
+        key = min(healthy, key=lambda k: (k['in_flight'], k['requests']))
+        key['in_flight'] += 1
+        key['requests'] += 1
+        return key
+
+    def release(self, key):
+        key['in_flight'] -= 1
+
+    def seconds_until_available(self, model_name: str) -> float:
+        now = time.monotonic()
+        return max(0.0, min(self._model_state(k, model_name)['cooldown_until'] for k in self._keys) - now)
+
+    def report_success(self, key, model_name: str):
+        state = self._model_state(key, model_name)
+        state['backoff'] = 0.0
+        state['consecutive_429'] = 0
+
+    def report_429(self, key, model_name: str, base_delay: float) -> float:
+        """Cooldown key untuk model ini: backoff eksponensial, atau istirahat panjang setelah 429 berulang."""
+        state = self._model_state(key, model_name)
+        key['errors_429'] += 1
+        state['consecutive_429'] += 1
+        state['backoff'] = min(state['backoff'] * 2 if state['backoff'] else base_delay, config.GEMINI_MAX_BACKOFF)
+        cooldown = state['backoff']
+        if state['consecutive_429'] >= config.GEMINI_KEY_MAX_429:
+            cooldown = max(cooldown, config.GEMINI_KEY_COOLDOWN)
+            print(f"🔑 Key {key['label']} diistirahatkan {cooldown:.0f} detik untuk {model_name}.")
+        state['cooldown_until'] = time.monotonic() + cooldown
+        return cooldown
+
+    def get_model(self, key, model_name: str):
+        # Client per key (bukan genai.configure global) agar setiap key punya kuota sendiri:
+        # GenerativeServiceAsyncClient dibuat dengan client_options publik berisi API key tersebut
+        if key['clients'] is None:
+            client = glm.GenerativeServiceAsyncClient(client_options={"api_key": key['api_key']})
+            key['clients'] = {'async': client, 'models': {}}
+        model = key['clients']['models'].get(model_name)
+        if model is None:
+            model = genai.GenerativeModel(model_name)
+            # GenerativeModel tidak menerima client lewat argumen; atribut ini ada di versi SDK yang
+            # dipin di requirements.txt. Jika hilang, gagal di sini daripada diam-diam kembali ke key global
+            if not hasattr(model, '_async_client'):
+                raise RuntimeError(
+                    "google-generativeai tidak punya GenerativeModel._async_client; "
+                    "client per key tidak bisa dipasang (cek versi di requirements.txt)."
+                )
+            model._async_client = key['clients']['async']
+            key['clients']['models'][model_name] = model
+        return model
+
+    def stats(self) -> list:
+        now = time.monotonic()
+        return [
+            {
+                "key": k['label'],
+                "in_flight": k['in_flight'],
+                "requests": k['requests'],
+                "errors_429": k['errors_429'],
+                "cooldown_seconds": {
+                    name: round(max(0.0, state['cooldown_until'] - now), 2) for name, state in k['models'].items()
+                }
+            }
+            for k in self._keys
+        ]
+
+key_pool = ApiKeyPool(config.GEMINI_API_KEYS)
+
+# --- SINGLE-FLIGHT ---
+class SingleFlight:
+    """
+    Gabungkan panggilan identik yang sedang berjalan (mis. handout yang sama dari satu kelas, tombol ditekan dua kali):
+    pemanggil berikutnya menunggu hasil atau error dari panggilan pertama, bukan memanggil Gemini/edge-tts lagi.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.saved = 0
+        self._calls = {}  # key -> [task, jumlah penunggu]
+
+    async def do(self, key: str, fn, *args):
+        call = self._calls.get(key)
+        if call is None:
+            call = [asyncio.ensure_future(fn(*args)), 0]
+            self._calls[key] = call
+            call[0].add_done_callback(lambda _: self._forget(key, call))
+        else:
+            self.saved += 1
+            metrics.singleflight_saved.inc(operation=self.name)
+        call[1] += 1
+        try:
+            # shield: penunggu yang batal tidak ikut membatalkan hasil untuk penunggu lain
+            return await asyncio.shield(call[0])
+        finally:
+            call[1] -= 1
+            if call[1] == 0 and not call[0].done():
+                # Semua penunggu batal: hentikan pekerjaannya, pemanggil baru mulai dari awal
+                self._forget(key, call)
+                call[0].cancel()
+
+    def _forget(self, key: str, call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    def stats(self) -> dict:
+        return {"in_flight": len(self._calls), "saved": self.saved}
+
+def _content_key(content):
+    """Hash isi request Gemini (teks + gambar), atau None jika ada bagian yang tidak bisa di-hash."""
+    digest = hashlib.sha256()
+    for part in content if isinstance(content, list) else [content]:
+        if isinstance(part, dict):
+            digest.update(str(part.get('mime_type', '')).encode('utf-8'))
+            part = part.get('data')
+        if isinstance(part, str):
+            part = part.encode('utf-8')
+        if not isinstance(part, (bytes, bytearray)):
+            return None
+        digest.update(len(part).to_bytes(8, 'big'))
+        digest.update(part)
+    return digest.hexdigest()
+
+gemini_flight = SingleFlight("gemini")
+preprocess_flight = SingleFlight("ocr_preprocess")
+tts_flight = SingleFlight("tts")
+
+async def model_backup(content, retries=3, delay=5):
+    # Prompt identik yang sedang berjalan cukup dikirim sekali ke Gemini
+    key = _content_key(content)
+    if key is None:
+        return await _model_backup(content, retries, delay)
+    return await gemini_flight.do(key, _model_backup, content, retries, delay)
+
+async def _model_backup(content, retries=3, delay=5):
     # Tentukan model awal
     current_model_name = MODEL_PRIMARY
+    priority = gemini_priority.get()
     
     for attempt in range(retries):
+        key = None
         try:
-            model = genai.GenerativeModel(current_model_name)
-            response = model.generate_content(content)
+            # Slot dibagikan penjadwal kuota (prioritas, RPM, jeda 429, concurrency)
+            async with quota_scheduler.slot(current_model_name, priority):
+                key = key_pool.acquire(current_model_name)
+                if key is None:
+                    # Semua key sedang cooldown: tahan model ini sampai ada key yang pulih
+                    quota_scheduler.pause(current_model_name, key_pool.seconds_until_available(current_model_name))
+                    continue
+                metrics.gemini_inflight.inc(model=current_model_name)
+                start = time.perf_counter()
+                outcome = "error"
+                try:
+                    model = key_pool.get_model(key, current_model_name)
+                    response = await model.generate_content_async(content)
+                    outcome = "ok"
+                except Exception as e:
+                    error_msg = str(e).lower()
+                    if "404" in error_msg or "not found" in error_msg: outcome = "404"
+                    elif "429" in error_msg or "quota" in error_msg: outcome = "429"
+                    raise
+                finally:
+                    key_pool.release(key)
+                    metrics.gemini_inflight.dec(model=current_model_name)
+                    metrics.gemini_seconds.observe(time.perf_counter() - start, model=current_model_name, outcome=outcome)
+            key_pool.report_success(key, current_model_name)
             return response
             
         except Exception as e:
@@ -35,14 +418,17 @@ def model_backup(content, retries=3, delay=5):
             # Model Tidak Ditemukan (404)
             if "404" in error_msg or "not found" in error_msg:
                 print(f"Model {current_model_name} tidak ditemukan (404). Menggunakan backup: {MODEL_BACKUP}")
+                metrics.gemini_fallbacks.inc(model=current_model_name)
                 current_model_name = MODEL_BACKUP 
                 continue 
                 
-            # Kena Limit Kuota (429)
+            # Kena Limit Kuota (429): key ini cooldown, request berikutnya pindah ke key lain
             elif "429" in error_msg or "quota" in error_msg:
-                print(f"⏳ Limit Kuota (429) di {current_model_name}. Menunggu {delay} detik...")
-                time.sleep(delay)
-                delay *= 2
+                metrics.gemini_429.inc(model=current_model_name)
+                wait = key_pool.report_429(key, current_model_name, delay)
+                print(f"⏳ Limit Kuota (429) di {current_model_name} ({key['label']}). Cooldown {wait:.1f} detik...")
+                if key_pool.seconds_until_available(current_model_name) > 0:
+                    quota_scheduler.pause(current_model_name, key_pool.seconds_until_available(current_model_name))
                 
             else:
                 print(f"Error Gemini ({current_model_name}): {e}")
@@ -51,100 +437,590 @@ def model_backup(content, retries=3, delay=5):
                     
     return None
 
+# --- CACHE HASIL (OCR / RINGKASAN / TERJEMAHAN) ---
+# Naikkan versi jika prompt berubah agar hasil lama tidak terpakai lagi
+PROMPT_VERSIONS = {'ocr': 2, 'summarize': 1, 'summarize_section': 1, 'translate': 1, 'translate_segment': 1}
+
+class ResultCache:
+    """Cache 2 tingkat: LRU di memori (batas jumlah + TTL) dan SQLite opsional di disk."""
+
+    def __init__(self, max_items: int, ttl: int, db_path: str = ""):
+        self.max_items = max_items
+        self.ttl = ttl
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._db = None
+        self._db_lock = threading.Lock()
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS result_cache "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    @staticmethod
+    def make_key(operation: str, data, target: str = "", model: str = MODEL_PRIMARY) -> str:
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        digest = hashlib.sha256(bytes(data)).hexdigest()
+        version = PROMPT_VERSIONS.get(operation, 0)
+        return f"{operation}:v{version}:{model}:{target}:{digest}"
+
+    def _memory_get(self, key):
+        entry = self._memory.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at < time.time():
+            del self._memory[key]
+            return None
+        self._memory.move_to_end(key)
+        return value
+
+    def _memory_set(self, key, value, expires_at):
+        self._memory[key] = (value, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_items:
+            self._memory.popitem(last=False)
+
+    def _disk_get(self, key):
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT value, expires_at FROM result_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row and row[1] < time.time():
+                self._db.execute("DELETE FROM result_cache WHERE key = ?", (key,))
+                self._db.commit()
+                return None
+        return row
+
+    def _disk_set(self, key, value, expires_at):
+        with self._db_lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO result_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, expires_at)
+            )
+            self._db.commit()
+
+    async def get(self, key: str):
+        value = self._memory_get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+        if self._db is not None:
+            row = await asyncio.to_thread(self._disk_get, key)
+            if row:
+                self._memory_set(key, row[0], row[1])
+                self.disk_hits += 1
+                return row[0]
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, value: str):
+        if not value:
+            return
+        expires_at = time.time() + self.ttl
+        self._memory_set(key, value, expires_at)
+        if self._db is not None:
+            await asyncio.to_thread(self._disk_set, key, value, expires_at)
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "items": len(self._memory),
+            "max_items": self.max_items,
+            "disk_enabled": self._db is not None
+        }
+
+result_cache = ResultCache(config.RESULT_CACHE_MAX_ITEMS, config.RESULT_CACHE_TTL, config.RESULT_CACHE_DB)
+
 # --- 1. OCR ---
-def ocr_with_gemini(image_bytes) -> str:
+OCR_PROMPT = "Extract all text from this image exactly as it appears. Do not summarize yet."
+OCR_FAILED = "Gagal mengekstrak teks (OCR gagal/Limit)."
+
+def preprocess_image(image_bytes) -> dict:
+    """Putar sesuai EXIF, perkecil ke OCR_MAX_DIMENSION, latar transparan jadi putih, (opsional) grayscale, lalu kompres ulang ke JPEG."""
+    image = Image.open(io.BytesIO(image_bytes))
+    image = ImageOps.exif_transpose(image)
+    if config.OCR_MAX_DIMENSION > 0:
+        image.thumbnail((config.OCR_MAX_DIMENSION, config.OCR_MAX_DIMENSION), Image.LANCZOS)
+    if image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info:
+        # JPEG tanpa alpha: area transparan jadi hitam dan teks gelap tidak terbaca, jadi tempel di atas putih
+        image = image.convert('RGBA')
+        background = Image.new('RGBA', image.size, (255, 255, 255, 255))
+        image = Image.alpha_composite(background, image)
+    image = image.convert('L' if config.OCR_GRAYSCALE else 'RGB')
+    out = io.BytesIO()
+    image.save(out, format='JPEG', quality=config.OCR_JPEG_QUALITY, optimize=True)
+    return {"mime_type": "image/jpeg", "data": out.getvalue()}
+
+async def ocr_with_gemini(image_bytes, progress_callback=None) -> str:
     try:
-        image = Image.open(io.BytesIO(image_bytes))
-        prompt = "Extract all text from this image exactly as it appears. Do not summarize yet."
+        cache_key = ResultCache.make_key('ocr', image_bytes)
+        cached = await result_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        # Tahap progres: 1 gambar siap, 2 respons Gemini diterima, 3 teks diproses
+        # Preprocessing gambar berat di CPU: jalankan di thread
+        image = await preprocess_flight.do(cache_key, asyncio.to_thread, preprocess_image, image_bytes)
+        if progress_callback: await progress_callback(1, 3)
         
-        response = model_backup([prompt, image])
+        response = await model_backup([OCR_PROMPT, image])
+        if progress_callback: await progress_callback(2, 3)
         
         if response and response.text:
-            return response.text.strip()
-        return "Gagal mengekstrak teks (OCR gagal/Limit)."
+            result = response.text.strip()
+            await result_cache.set(cache_key, result)
+            if progress_callback: await progress_callback(3, 3)
+            return result
+        return OCR_FAILED
     except Exception as e:
         print(f"Error Gemini OCR: {e}")
         return None
 
+_IMAGE_MARKER = re.compile(r'^=== IMAGE (\d+) ===[ \t]*$', re.MULTILINE)
+
+async def _ocr_group(images: list) -> list:
+    """OCR beberapa gambar dalam satu request Gemini. Return list teks (None jika gagal)."""
+    prompt = (
+        f"Extract all text from each of the {len(images)} images below exactly as it appears. Do not summarize. "
+        "For every image, first output a line '=== IMAGE n ===' (n is the image number), "
+        "then the text of that image. If an image contains no text, output nothing after its marker."
+    )
+    content = [prompt]
+    for i, image in enumerate(images):
+        content.extend([f"Image {i + 1}:", image])
+
+    response = await model_backup(content)
+    if not response or not response.text:
+        return [None] * len(images)
+
+    parts = _IMAGE_MARKER.split(response.text)
+    results = {}
+    for number, text in zip(parts[1::2], parts[2::2]):
+        results[int(number)] = text.strip()
+    if len(results) != len(images):
+        return None
+    return [results.get(i + 1) for i in range(len(images))]
+
+async def ocr_batch(images_bytes: list, progress_callback=None) -> list:
+    """OCR banyak gambar sekaligus (dikelompokkan per OCR_BATCH_SIZE gambar per request). Hasil sesuai urutan input."""
+    results = [None] * len(images_bytes)
+    keys = [ResultCache.make_key('ocr', b) for b in images_bytes]
+    pending = []
+    for i, key in enumerate(keys):
+        results[i] = await result_cache.get(key)
+        if results[i] is None:
+            pending.append(i)
+
+    async def run_group(indexes):
+        try:
+            images = await asyncio.gather(*(asyncio.to_thread(preprocess_image, images_bytes[i]) for i in indexes))
+            texts = await _ocr_group(list(images)) if len(indexes) > 1 else None
+        except Exception as e:
+            print(f"Error Gemini OCR Batch: {e}")
+            texts = None
+        if texts is None:
+            # Format jawaban tidak sesuai (atau hanya 1 gambar): OCR satu per satu
+            texts = await asyncio.gather(*(ocr_with_gemini(images_bytes[i]) for i in indexes))
+            texts = [t if t != OCR_FAILED else None for t in texts]
+        for i, text in zip(indexes, texts):
+            results[i] = text
+            if text is not None:
+                await result_cache.set(keys[i], text)
+        done[0] += len(indexes)
+        if progress_callback: await progress_callback(done[0], len(pending))
+
+    size = max(1, config.OCR_BATCH_SIZE)
+    done = [0]
+    await asyncio.gather(*(run_group(pending[i:i + size]) for i in range(0, len(pending), size)))
+    return results
+
 # --- 2. SUMMARIZER ---
-def summarize_text(text: str) -> str:
-    try:
+SUMMARY_RULES = (
+    "1. The summary MUST be significantly shorter than the original text. "
+    "2. Do NOT use introductory phrases like 'Here is the summary', 'Halo pendengar', or 'Berikut ringkasannya'. "
+    "3. Start directly with the main content. "
+    "4. Combine main ideas into flowing paragraphs. "
+    "5. Do NOT use bullet points. "
+    "6. Respond in the same language as the original text.\n\n"
+)
+
+def split_into_sections(text: str, limit: int) -> list:
+    """Bagi teks menjadi bagian <= limit karakter, sebisa mungkin di batas paragraf lalu kalimat."""
+    return [text[start:end] for start, end in segmenter.pack(text, max_chars=limit)]
+
+async def _summarize_prompt(prompt: str) -> str:
+    response = await model_backup(prompt)
+    if not response or not response.text:
+        return None
+    clean_text = response.text.strip()
+    return clean_text.replace("* ", "").replace("- ", "").replace("• ", "").replace("**", "")
+
+async def _map_reduce_summary(text: str, progress_callback=None) -> str:
+    """Ringkas dokumen panjang: ringkas tiap bagian secara paralel, lalu gabungkan (rekursif bila perlu)."""
+    section_limit = config.SUMMARY_SECTION_CHARS
+    limiter = asyncio.Semaphore(config.SUMMARY_WORKERS)
+    sections = split_into_sections(text, section_limit)
+    progress = {'done': 0, 'total': len(sections) + 1}
+
+    async def report():
+        progress['done'] += 1
+        if progress_callback:
+            await progress_callback(progress['done'], progress['total'])
+
+    async def summarize_section(section, index, total):
+        # Prompt menyebut posisi bagian, jadi posisi & jumlah bagian ikut menjadi kunci cache
+        cache_key = ResultCache.make_key('summarize_section', section, f"{index + 1}/{total}")
+        result = await result_cache.get(cache_key)
+        if result is None:
+            prompt = (
+                f"You are a professional editor. The text below is part {index + 1} of {total} of a longer document. "
+                "Summarize this part concisely and keep its key facts, names and numbers. "
+                f"{SUMMARY_RULES}"
+                f"TEXT TO SUMMARIZE:\n{section}"
+            )
+            async with limiter:
+                result = await _summarize_prompt(prompt)
+            await result_cache.set(cache_key, result)
+        await report()
+        return result
+
+    async def reduce_group(group):
         prompt = (
-            "You are a professional editor. Your goal is to summarize the text concisely. "
-            "1. The summary MUST be significantly shorter than the original text. "
-            "2. Do NOT use introductory phrases like 'Here is the summary', 'Halo pendengar', or 'Berikut ringkasannya'. "
-            "3. Start directly with the main content. "
-            "4. Combine main ideas into flowing paragraphs. "
-            "5. Do NOT use bullet points. "
-            "6. Respond in the same language as the original text.\n\n"
-            f"TEXT TO SUMMARIZE:\n{text[:config.MAX_CHARS]}"
+            "You are a professional editor. The text below contains summaries of consecutive parts of one document. "
+            "Condense them into one shorter summary that keeps the order of ideas. "
+            f"{SUMMARY_RULES}"
+            f"SUMMARIES:\n{group}"
         )
+        async with limiter:
+            result = await _summarize_prompt(prompt)
+        await report()
+        return result
+
+    # MAP: ringkas semua bagian
+    partials = await asyncio.gather(*(summarize_section(s, i, len(sections)) for i, s in enumerate(sections)))
+    if any(p is None for p in partials):
+        return None
+    combined = "\n\n".join(partials)
+
+    # REDUCE bertingkat sampai gabungan ringkasan muat dalam satu prompt
+    while len(combined) > section_limit:
+        groups = split_into_sections(combined, section_limit)
+        progress['total'] += len(groups)
+        partials = await asyncio.gather(*(reduce_group(g) for g in groups))
+        if any(p is None for p in partials):
+            return None
+        reduced = "\n\n".join(partials)
+        if len(reduced) >= len(combined):
+            # Model tidak lagi memendekkan teks; hentikan agar tidak berputar terus
+            combined = reduced[:section_limit]
+            break
+        combined = reduced
+
+    prompt = (
+        "You are a professional editor. The text below contains summaries of consecutive parts of one document. "
+        "Merge them into a single concise summary of the whole document. "
+        f"{SUMMARY_RULES}"
+        f"SUMMARIES:\n{combined}"
+    )
+    final = await _summarize_prompt(prompt)
+    await report()
+    return final
+
+async def summarize_text(text: str, progress_callback=None, strict: bool = False) -> str:
+    """Ringkas teks. strict=True: lempar ServiceError saat gagal, bukan mengembalikan pesan error."""
+    try:
+        cache_key = ResultCache.make_key('summarize', text)
+        cached = await result_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        if len(text) > config.MAX_CHARS:
+            # Dokumen panjang: map-reduce, tanpa memotong ekor teks
+            clean_text = await _map_reduce_summary(text, progress_callback)
+        else:
+            prompt = (
+                "You are a professional editor. Your goal is to summarize the text concisely. "
+                f"{SUMMARY_RULES}"
+                f"TEXT TO SUMMARIZE:\n{text}"
+            )
+            clean_text = await _summarize_prompt(prompt)
         
-        response = model_backup(prompt)
-        
-        if not response or not response.text:
+        if not clean_text:
+            if strict: raise ServiceError("AI gagal merespons (Limit Kuota).")
             return "Maaf, AI gagal merespons (Limit Kuota). Silakan coba lagi nanti."
             
-        clean_text = response.text.strip()
-        clean_text = clean_text.replace("* ", "").replace("- ", "").replace("• ", "").replace("**", "")
+        await result_cache.set(cache_key, clean_text)
         return clean_text
 
+    except ServiceError:
+        raise
     except Exception as e:
+        if strict: raise ServiceError(f"Gagal Meringkas. Error: {str(e)}") from e
         return f"Gagal Meringkas. Error: {str(e)}"
 
 # --- 3. TRANSLATOR ---
-def translate_text(text: str, target_lang_code: str) -> str:
-    try:
-        target_lang_name = LANG_NAMES.get(target_lang_code, 'English')
-        prompt = (
-            f"Translate the following text into natural, native-sounding {target_lang_name}. "
-            "STRICT RULES:\n"
-            f"1. If the text is ALREADY in {target_lang_name}, RETURN IT EXACTLY AS IS. DO NOT PARAPHRASE.\n"
-            "2. Translate accurately without adding explanations.\n"
-            "3. Do not add introductory phrases.\n\n"
-            f"TEXT:\n{text[:config.MAX_CHARS]}"
-        )
-        
-        response = model_backup(prompt)
+async def _translate_segment(segment: str, target_lang_code: str) -> str:
+    cache_key = ResultCache.make_key('translate_segment', segment, target_lang_code)
+    cached = await result_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    target_lang_name = LANG_NAMES.get(target_lang_code, 'English')
+    prompt = (
+        f"Translate the following text into natural, native-sounding {target_lang_name}. "
+        "STRICT RULES:\n"
+        f"1. If the text is ALREADY in {target_lang_name}, RETURN IT EXACTLY AS IS. DO NOT PARAPHRASE.\n"
+        "2. Translate accurately without adding explanations.\n"
+        "3. Do not add introductory phrases.\n\n"
+        f"TEXT:\n{segment}"
+    )
+    
+    response = await model_backup(prompt)
+    
+    if not response or not response.text:
+        return None
         
-        if not response or not response.text: 
+    result = response.text.strip()
+    await result_cache.set(cache_key, result)
+    return result
+
+async def translate_text(text: str, target_lang_code: str, progress_callback=None, strict: bool = False) -> str:
+    """Terjemahkan teks. Saat gagal mengembalikan teks asli, kecuali strict=True (lempar ServiceError)."""
+    try:
+        cache_key = ResultCache.make_key('translate', text, target_lang_code)
+        cached = await result_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        # Terjemahkan per segmen secara paralel, lalu susun ulang sesuai urutan
+        segmentation = segmenter.segment(text)
+        spans = segmentation.pack(max_chars=config.TRANSLATE_SEGMENT_CHARS)
+        if not spans:
+            return text
+        segments = [text[start:end] for start, end in spans]
+        results = [None] * len(segments)
+        limiter = asyncio.Semaphore(config.TRANSLATE_WORKERS)
+        done_count = 0
+
+        async def run_segment(i):
+            nonlocal done_count
+            async with limiter:
+                try:
+                    results[i] = await _translate_segment(segments[i], target_lang_code)
+                except Exception as e:
+                    print(f"Error Translate Segmen {i}: {e}")
+            if results[i] is not None:
+                done_count += 1
+                if progress_callback:
+                    await progress_callback(done_count, len(segments))
+
+        # Ulangi hanya segmen yang gagal
+        for attempt in range(config.TRANSLATE_SEGMENT_RETRIES + 1):
+            pending = [i for i, r in enumerate(results) if r is None]
+            if not pending:
+                break
+            if attempt > 0:
+                print(f"Translate: mengulang {len(pending)} segmen yang gagal (Percobaan {attempt+1})...")
+            await asyncio.gather(*(run_segment(i) for i in pending))
+
+        failed = [i for i, r in enumerate(results) if r is None]
+        if failed and strict:
+            raise ServiceError(f"Gagal menerjemahkan {len(failed)} dari {len(segments)} segmen.")
+        if len(failed) == len(segments):
             print("Translate Gagal (Limit), mengembalikan teks asli.")
-            return text 
-            
-        return response.text.strip()
+            return text
+        if failed:
+            # Segmen yang tetap gagal dibiarkan dalam teks asli
+            print(f"Translate: {len(failed)} segmen gagal, memakai teks asli untuk segmen tersebut.")
+            return segmentation.join(spans, [r if r is not None else segments[i] for i, r in enumerate(results)])
+
+        result = segmentation.join(spans, results)
+        await result_cache.set(cache_key, result)
+        return result
+    except ServiceError:
+        raise
     except Exception as e:
         print(f"Error Translate: {e}")
+        if strict: raise ServiceError(f"Gagal Menerjemahkan. Error: {str(e)}") from e
         return text 
 
 # --- 4. TTS GENERATOR ---
+# Karakter yang tetap dibaca TTS: huruf/angka semua bahasa dan tanda baca kalimat id, en, ja, ko, ar
+_TTS_UNREADABLE = re.compile(r"[^\w\s.,?!'%:;\-…。、！？，؟،؛۔]")
+
 def clean_text_for_tts(text: str) -> str:
     """Membersihkan teks dari karakter markdown agar TTS tidak bingung."""
     # Hapus bold/italic marker markdown (* atau _)
     text = text.replace("**", "").replace("__", "").replace("*", "")
     # Hapus karakter aneh yang mungkin tidak terbaca
-    text = re.sub(r'[^\w\s.,?!-]', '', text) 
-    return text.strip()
+    text = _TTS_UNREADABLE.sub('', text)
+    return re.sub(r'\s+', ' ', text).strip()
 
 def split_text_smartly(text, limit):
-    chunks = []
-    current_chunk = ""
+    """Potong teks per kalimat (semua bahasa) menjadi chunk <= limit karakter dan <= TTS_CHUNK_BYTES byte."""
     if not text: return []
-    
-    # Bersihkan teks dulu
-    text = clean_text_for_tts(text)
-    
-    # Split berdasarkan kalimat
-    sentences = text.replace('\n', ' ').split('. ') 
-    
-    for sentence in sentences:
-        if len(current_chunk) + len(sentence) < limit:
-            current_chunk += sentence + ". "
-        else:
-            if current_chunk: chunks.append(current_chunk.strip())
-            current_chunk = sentence + ". "
-    if current_chunk:
-        chunks.append(current_chunk.strip())
-    return chunks
+    # Potong dulu di teks asli agar tanda baca kalimat (。 ؟ dst.) masih ada, baru dibersihkan per chunk
+    spans = segmenter.pack(text, max_chars=limit, max_bytes=config.TTS_CHUNK_BYTES, prefer=segmenter.SENTENCE)
+    return [clean_text_for_tts(text[start:end]) for start, end in spans]
+
+_tts_semaphore = asyncio.Semaphore(config.TTS_CONCURRENCY)
+
+class AudioCache:
+    """Cache segmen MP3 per (chunk teks, voice) di disk, dibatasi ukuran total dengan eviksi LRU."""
+
+    def __init__(self, cache_dir: str, max_mb: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_mb * 1024 * 1024
+        self.hits = 0
+        self.misses = 0
+        self.total_bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if self.enabled:
+            os.makedirs(cache_dir, exist_ok=True)
+            # Urutkan file lama berdasarkan mtime agar urutan LRU bertahan setelah restart
+            files = []
+            for name in os.listdir(cache_dir):
+                if name.endswith('.mp3'):
+                    st = os.stat(os.path.join(cache_dir, name))
+                    files.append((st.st_mtime, name[:-4], st.st_size))
+            for _, key, size in sorted(files):
+                self._entries[key] = size
+                self.total_bytes += size
+            self._evict()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    @staticmethod
+    def make_key(chunk: str, voice: str) -> str:
+        normalized = " ".join(chunk.split())
+        return hashlib.sha256(f"{voice}\n{normalized}".encode('utf-8')).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.mp3")
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self.total_bytes -= size
+            try: os.remove(self._path(key))
+            except OSError: pass
+
+    def _read(self, key: str):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+            return data
+        except OSError:
+            return None
+
+    def _write(self, key: str, data: bytes):
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self.total_bytes -= self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            self.total_bytes += len(data)
+            self._evict()
+
+    async def get(self, chunk: str, voice: str):
+        if not self.enabled:
+            return None
+        key = self.make_key(chunk, voice)
+        with self._lock:
+            known = key in self._entries
+            if known:
+                self._entries.move_to_end(key)
+        data = await asyncio.to_thread(self._read, key) if known else None
+        if data:
+            self.hits += 1
+            return data
+        self.misses += 1
+        return None
+
+    async def set(self, chunk: str, voice: str, data: bytes):
+        if not self.enabled or not data:
+            return
+        try:
+            await asyncio.to_thread(self._write, self.make_key(chunk, voice), data)
+        except OSError as e:
+            print(f"Error Cache Audio: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "items": len(self._entries),
+            "size_mb": round(self.total_bytes / 1024 / 1024, 2),
+            "max_mb": round(self.max_bytes / 1024 / 1024, 2)
+        }
+
+audio_cache = AudioCache(config.TTS_CACHE_DIR, config.TTS_CACHE_MAX_MB)
+
+def get_voice(lang: str, gender: str) -> str:
+    voice_dict = config.VOICE_MAPPING.get(lang, config.VOICE_MAPPING['en'])
+    return voice_dict.get(gender, voice_dict['female'])
+
+def get_tts_chunks(text: str) -> list:
+    return [c for c in split_text_smartly(text, config.CHUNK_SIZE) if c.strip()]
+
+async def synthesize_chunk(chunk: str, voice: str, index: int = 0, max_retries: int = 3, on_data=None) -> bytes:
+    """
+    Sintesis satu chunk teks menjadi bytes MP3 (dengan retry non-blocking).
+    on_data(percobaan, bytes) dipanggil untuk tiap potongan audio dari edge-tts (untuk streaming);
+    tidak dipanggil jika hasil diambil dari cache atau dari sintesis yang sama milik request lain.
+    """
+    # Chunk + voice yang sama sedang disintesis untuk request lain: tunggu hasilnya saja
+    return await tts_flight.do(
+        AudioCache.make_key(chunk, voice), _synthesize_chunk, chunk, voice, index, max_retries, on_data
+    )
+
+async def _synthesize_chunk(chunk: str, voice: str, index: int, max_retries: int, on_data=None) -> bytes:
+    cached = await audio_cache.get(chunk, voice)
+    if cached:
+        return cached
+
+    for attempt in range(max_retries):
+        if attempt:
+            metrics.tts_retries.inc()
+        try:
+            async with _tts_semaphore:
+                with metrics.timer(metrics.tts_chunk_seconds, metrics.tts_inflight):
+                    communicate = edge_tts.Communicate(chunk, voice)
+                    audio = bytearray()
+                    async for message in communicate.stream():
+                        if message["type"] == "audio":
+                            audio.extend(message["data"])
+                            if on_data:
+                                on_data(attempt, message["data"])
+            # Cek size audio
+            if audio:
+                audio = bytes(audio)
+                await audio_cache.set(chunk, voice, audio)
+                return audio
+            print(f"Warning: Chunk {index} 0 bytes. Retry {attempt+1}...")
+        except Exception as e:
+            print(f"Error Chunk {index} (Percobaan {attempt+1}): {e}")
+            if attempt == max_retries - 1:
+                print(f"Gagal total pada chunk {index}")
+        if attempt < max_retries - 1:
+            await asyncio.sleep(1)
+    return None
 
 async def generate_audio_long(text: str, lang: str, gender: str, user_id: str, progress_callback=None) -> str:
     try:
@@ -152,57 +1028,38 @@ async def generate_audio_long(text: str, lang: str, gender: str, user_id: str, p
             print("Error TTS: Teks input kosong.")
             return None
 
-        voice_dict = config.VOICE_MAPPING.get(lang, config.VOICE_MAPPING['en'])
-        selected_voice = voice_dict.get(gender, voice_dict['female'])
-        
-        chunks = split_text_smartly(text, config.CHUNK_SIZE)
+        selected_voice = get_voice(lang, gender)
+        chunks = get_tts_chunks(text)
         total_chunks = len(chunks)
-        temp_files = []
 
         if total_chunks == 0:
             print("Error TTS: Tidak ada chunk teks yang dihasilkan.")
             return None
 
-        for i, chunk in enumerate(chunks):
-            if not chunk.strip(): continue
-            
-            # Update Progress Bar di Telegram 
+        # Sintesis paralel (dibatasi TTS_CONCURRENCY), progress dilaporkan saat chunk selesai
+        done_count = 0
+
+        async def run_chunk(i, chunk):
+            nonlocal done_count
+            audio = await synthesize_chunk(chunk, selected_voice, i)
+            done_count += 1
             if progress_callback:
-                await progress_callback(i + 1, total_chunks)
+                await progress_callback(done_count, total_chunks)
+            return audio
 
-            temp_file = f"temp_{user_id}_part{i}.mp3"
-            
-            # RETRY LOGIC UNTUK TTS
-            max_retries = 3
-            for attempt in range(max_retries):
-                try:
-                    communicate = edge_tts.Communicate(chunk, selected_voice)
-                    await communicate.save(temp_file)
-                    # Cek size file
-                    if os.path.getsize(temp_file) > 0:
-                        temp_files.append(temp_file)
-                        break # Sukses, keluar loop retry
-                    else:
-                        print(f"Warning: Chunk {i} 0 bytes. Retry {attempt+1}...")
-                except Exception as e:
-                    print(f"Error Chunk {i} (Percobaan {attempt+1}): {e}")
-                    if attempt == max_retries - 1:
-                        print(f"Gagal total pada chunk {i}")
-                    time.sleep(1)
+        results = await asyncio.gather(*(run_chunk(i, c) for i, c in enumerate(chunks)))
+        audio_parts = [r for r in results if r]
 
-        # Cek apakah ada file yang berhasil dibuat
-        if not temp_files:
+        # Cek apakah ada audio yang berhasil dibuat
+        if not audio_parts:
             print("Error TTS: Tidak ada file audio yang berhasil dibuat.")
             return None
 
-        # Merge
+        # Merge sesuai urutan chunk
         final_filename = f"audio_{user_id}_final.mp3"
         with open(final_filename, 'wb') as outfile:
-            for f_path in temp_files:
-                if os.path.exists(f_path):
-                    with open(f_path, 'rb') as infile:
-                        outfile.write(infile.read())
-                    os.remove(f_path) 
+            for part in audio_parts:
+                outfile.write(part)
 
         return final_filename
 
@@ -210,26 +1067,336 @@ async def generate_audio_long(text: str, lang: str, gender: str, user_id: str, p
         print(f"CRITICAL Error TTS Long: {e}")
         return None
 
+async def translate_to_audio(text: str, target_lang_code: str, lang: str, gender: str, user_id: str,
+                             progress_callback=None, strict: bool = False):
+    """
+    Terjemahkan lalu bacakan teks secara bertumpuk: audio segmen k disintesis sementara segmen k+1
+    masih diterjemahkan, lalu audio ditulis sesuai urutan. Mengembalikan (teks terjemahan, path audio / None).
+    """
+    cache_key = ResultCache.make_key('translate', text, target_lang_code)
+    cached = await result_cache.get(cache_key)
+    if cached is not None:
+        return cached, await generate_audio_long(cached, lang, gender, user_id, progress_callback)
+
+    segmentation = segmenter.segment(text)
+    spans = segmentation.pack(max_chars=config.TRANSLATE_SEGMENT_CHARS)
+    if not spans:
+        return text, None
+    selected_voice = get_voice(lang, gender)
+    limiter = asyncio.Semaphore(config.TRANSLATE_WORKERS)
+    translations = [None] * len(spans)
+    failed = []
+    # Tiap segmen dihitung dua langkah: terjemahan selesai, audio selesai
+    progress = {'done': 0, 'total': 2 * len(spans)}
+
+    async def report():
+        progress['done'] += 1
+        if progress_callback:
+            await progress_callback(progress['done'], progress['total'])
+
+    async def translate(i):
+        segment = text[spans[i][0]:spans[i][1]]
+        for attempt in range(config.TRANSLATE_SEGMENT_RETRIES + 1):
+            async with limiter:
+                try:
+                    result = await _translate_segment(segment, target_lang_code)
+                except Exception as e:
+                    print(f"Error Translate Segmen {i} (Percobaan {attempt+1}): {e}")
+                    result = None
+            if result is not None:
+                return result
+        if strict:
+            raise ServiceError(f"Gagal menerjemahkan segmen {i + 1} dari {len(spans)}.")
+        # Segmen yang tetap gagal dibacakan dalam teks asli
+        failed.append(i)
+        return segment
+
+    async def run_segment(i):
+        translations[i] = await translate(i)
+        await report()
+        chunks = get_tts_chunks(translations[i])
+        audio = await asyncio.gather(*(synthesize_chunk(c, selected_voice, i) for c in chunks))
+        await report()
+        return audio
+
+    # Task dibuat berurutan sehingga segmen awal mendapat slot terjemahan lebih dulu
+    tasks = [asyncio.create_task(run_segment(i)) for i in range(len(spans))]
+    final_filename = f"audio_{user_id}_final.mp3"
+    written = 0
+    try:
+        with open(final_filename, 'wb') as outfile:
+            for task in tasks:
+                for part in await task:
+                    if part:
+                        outfile.write(part)
+                        written += 1
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if os.path.exists(final_filename):
+            os.remove(final_filename)
+        raise
+
+    translated = segmentation.join(spans, translations)
+    if failed:
+        print(f"Translate: {len(failed)} segmen gagal, memakai teks asli untuk segmen tersebut.")
+    else:
+        await result_cache.set(cache_key, translated)
+    if not written:
+        print("Error TTS: Tidak ada file audio yang berhasil dibuat.")
+        os.remove(final_filename)
+        return translated, None
+    return translated, final_filename
+
+async def stream_audio(text: str, lang: str, gender: str):
+    """Yield bytes MP3 berurutan: chunk pertama di-stream sambil disintesis, chunk berikutnya disintesis di background."""
+    selected_voice = get_voice(lang, gender)
+    chunks = get_tts_chunks(text) if text else []
+    if not chunks:
+        return
+
+    # Sintesis di depan maksimal TTS_CONCURRENCY chunk agar memori tetap terbatas
+    lookahead = max(1, config.TTS_CONCURRENCY)
+    tasks = {}
+    scheduled = 1
+
+    def schedule(upto):
+        # Chunk yang sudah diambil dari tasks tidak dijadwalkan ulang
+        nonlocal scheduled
+        while scheduled < min(upto, len(chunks)):
+            tasks[scheduled] = asyncio.create_task(synthesize_chunk(chunks[scheduled], selected_voice, scheduled))
+            scheduled += 1
+
+    # Chunk pertama lewat jalur yang sama dengan chunk lain (cache, tts_flight, _tts_semaphore, metrik, retry);
+    # potongan audionya diteruskan lewat antrean begitu diterima dari edge-tts
+    pieces = asyncio.Queue()
+    first = asyncio.ensure_future(synthesize_chunk(
+        chunks[0], selected_voice, 0, on_data=lambda attempt, data: pieces.put_nowait((attempt, data))
+    ))
+    first.add_done_callback(lambda _: pieces.put_nowait(None))
+    tasks[0] = first
+
+    try:
+        schedule(1 + lookahead)
+
+        sent = bytearray()
+        current, produced, diverged = 0, 0, False
+        while (item := await pieces.get()) is not None:
+            attempt, data = item
+            if attempt != current:
+                current, produced = attempt, 0
+            start, produced = produced, produced + len(data)
+            if diverged or produced <= len(sent):
+                # Percobaan ulang setelah putus di tengah: byte yang sudah terkirim dilewati
+                if not diverged and data != sent[start:produced]:
+                    diverged = True
+                continue
+            if start < len(sent):
+                if data[:len(sent) - start] != sent[start:]:
+                    diverged = True
+                    continue
+                data = data[len(sent) - start:]
+            sent.extend(data)
+            yield data
+        audio = first.result()
+        tasks.pop(0)
+        if not sent:
+            # Dari cache atau dari sintesis milik request lain: dikirim utuh
+            if audio:
+                yield audio
+        elif diverged or not audio:
+            # Sama seperti chunk lain yang gagal: audio chunk ini tidak lengkap, lanjut ke chunk berikutnya
+            print(f"Error Stream Chunk 0: audio terpotong setelah {len(sent)} byte.")
+
+        for i in range(1, len(chunks)):
+            schedule(i + 1 + lookahead)
+            audio = await tasks.pop(i)
+            if audio:
+                yield audio
+    finally:
+        # Client putus di tengah jalan: batalkan sintesis yang tersisa
+        for task in tasks.values():
+            task.cancel()
+
 # --- 5. FILE EXTRACTOR ---
-def extract_document_content(file_path: str) -> str:
-    text = ""
+_pdf_pool = None
+
+def _get_pdf_pool():
+    global _pdf_pool
+    if _pdf_pool is None:
+        # forkserver, bukan fork: proses ini sudah punya thread grpc & asyncio yang bisa membuat anak fork deadlock
+        _pdf_pool = ProcessPoolExecutor(
+            max_workers=config.PDF_WORKERS, mp_context=multiprocessing.get_context("forkserver")
+        )
+    return _pdf_pool
+
+def _pdf_pool_pending() -> int:
+    # Tugas halaman PDF yang belum selesai (menunggu + sedang jalan) di process pool
+    return len(_pdf_pool._pending_work_items) if _pdf_pool is not None else 0
+
+metrics.queue_depth.set_function(_pdf_pool_pending, queue="pdf_pool")
+
+def load_backends():
+    for backend in BACKENDS:
+        backend.load()
+
+async def warm_up():
+    """Muat semua backend di thread, lalu siapkan client Gemini per key (setelah server menerima traffic)."""
+    await asyncio.to_thread(load_backends)
+    # Client async grpc harus dibuat di thread event loop, bukan di worker thread
+    for key in key_pool._keys:
+        for model_name in (MODEL_PRIMARY, MODEL_BACKUP):
+            key_pool.get_model(key, model_name)
+
+def shutdown_workers():
+    global _pdf_pool
+    if _pdf_pool is not None:
+        _pdf_pool.shutdown(wait=False, cancel_futures=True)
+        _pdf_pool = None
+
+def _open_binary(source):
+    """Buka sumber dokumen (path, bytes, atau buffer file-like) sebagai stream biner."""
+    if isinstance(source, str):
+        return open(source, 'rb')
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return io.BytesIO(source)
+    source.seek(0)
+    # Buffer milik pemanggil: jangan ditutup di sini
+    return contextlib.nullcontext(source)
+
+def _extract_pdf_range(source, start: int, end: int) -> list:
+    # Dijalankan di process pool: buka ulang PDF (path / bytes) dan ekstrak halaman [start, end)
+    with _open_binary(source) as f:
+        reader = PyPDF2.PdfReader(f)
+        return [reader.pages[i].extract_text() or "" for i in range(start, end)]
+
+def iter_pdf_pages(source, progress_callback=None):
+    """
+    Yield teks per halaman secara berurutan. PDF besar dibagi per rentang halaman ke process pool.
+    progress_callback(halaman, total) dipanggil (sinkron, dari thread pemanggil) setiap halaman selesai.
+    """
+    with _open_binary(source) as f:
+        reader = PyPDF2.PdfReader(f)
+        total_pages = len(reader.pages)
+        if config.PDF_WORKERS <= 1 or total_pages < config.PDF_PARALLEL_MIN_PAGES:
+            for i, page in enumerate(reader.pages):
+                yield page.extract_text() or ""
+                if progress_callback: progress_callback(i + 1, total_pages)
+            return
+        # Worker proses cukup menerima path: bytes / buffer ditulis sekali ke file sementara,
+        # bukan di-pickle ulang untuk setiap rentang halaman
+        spool_path = None
+        if not isinstance(source, str):
+            f.seek(0)
+            with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as spool:
+                shutil.copyfileobj(f, spool)
+            source = spool_path = spool.name
+
+    # Hanya beberapa rentang yang dikirim di depan, agar berhenti lebih awal tidak membuang kerja
+    pool = _get_pdf_pool()
+    step = config.PDF_PAGES_PER_TASK
+    window = config.PDF_WORKERS * 2
+    futures = deque()
+    next_start = 0
+    done_pages = 0
+    try:
+        while futures or next_start < total_pages:
+            while next_start < total_pages and len(futures) < window:
+                end = min(next_start + step, total_pages)
+                futures.append(pool.submit(_extract_pdf_range, source, next_start, end))
+                next_start = end
+            for page_text in futures.popleft().result():
+                yield page_text
+                done_pages += 1
+                if progress_callback: progress_callback(done_pages, total_pages)
+    finally:
+        for future in futures:
+            future.cancel()
+        if spool_path:
+            try: os.remove(spool_path)
+            except OSError: pass
+
+W_NS = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+MC_FALLBACK = '{http://schemas.openxmlformats.org/markup-compatibility/2006}Fallback'
+
+def iter_docx_paragraphs(source):
+    """Yield teks paragraf DOCX (termasuk isi sel tabel) sesuai urutan dokumen, langsung dari word/document.xml."""
+    with _open_binary(source) as f, zipfile.ZipFile(f) as zf, zf.open('word/document.xml') as xml_file:
+        stack = []
+        body = None
+        depth = 0
+        # Isi mc:Fallback (mis. text box versi VML) duplikat dari mc:Choice: dilewati
+        fallback = 0
+        for event, elem in ET.iterparse(xml_file, events=('start', 'end')):
+            tag = elem.tag
+            if event == 'start':
+                depth += 1
+                if tag == MC_FALLBACK:
+                    fallback += 1
+                elif fallback:
+                    continue
+                elif tag == W_NS + 'body':
+                    body = elem
+                    body_depth = depth
+                elif tag == W_NS + 'p':
+                    stack.append([])
+                continue
+
+            depth -= 1
+            if tag == MC_FALLBACK:
+                fallback -= 1
+                continue
+            if fallback:
+                continue
+            if stack:
+                if tag == W_NS + 't':
+                    stack[-1].append(elem.text or "")
+                elif tag == W_NS + 'tab':
+                    stack[-1].append("\t")
+                elif tag in (W_NS + 'br', W_NS + 'cr'):
+                    stack[-1].append("\n")
+            if tag == W_NS + 'p':
+                yield "".join(stack.pop())
+            # Buang elemen level atas yang sudah selesai agar memori tetap kecil
+            if body is not None and depth == body_depth:
+                body.clear()
+
+def extract_document_content(source, max_chars: int = None, filename: str = None, progress_callback=None) -> str:
+    """
+    Ekstrak teks dokumen dari path, bytes, atau buffer file-like (jenis file dari filename / path).
+    Jika max_chars diisi, pembacaan berhenti begitu teks melewati batas tersebut.
+    progress_callback(cur, tot) sinkron, saat ini dilaporkan per halaman PDF.
+    """
+    name = (filename or (source if isinstance(source, str) else "")).lower()
+    # rsplit, bukan splitext: filename boleh hanya ekstensi ('.pdf'), yang oleh splitext dianggap nama file
+    kind = name.rsplit('.', 1)[-1] if '.' in os.path.basename(name) else "unknown"
+    parts = []
+    start = time.perf_counter()
     try:
-        if file_path.endswith('.pdf'):
-            with open(file_path, 'rb') as f:
-                reader = PyPDF2.PdfReader(f)
-                for page in reader.pages:
-                    t = page.extract_text()
-                    if t: text += t + "\n"
-        elif file_path.endswith('.docx'):
-            doc = docx.Document(file_path)
-            for para in doc.paragraphs: text += para.text + "\n"
-            for table in doc.tables:
-                for row in table.rows:
-                    for cell in row.cells:
-                        for para in cell.paragraphs: text += para.text + "\n"
-        elif file_path.endswith('.txt'):
-            with open(file_path, 'r', encoding='utf-8') as f: text = f.read()
+        if name.endswith('.pdf'):
+            length = 0
+            for t in iter_pdf_pages(source, progress_callback):
+                if not t: continue
+                parts.append(t)
+                length += len(t) + 1
+                if max_chars and length > max_chars: break
+        elif name.endswith('.docx'):
+            length = 0
+            for t in iter_docx_paragraphs(source):
+                parts.append(t)
+                length += len(t) + 1
+                if max_chars and length > max_chars: break
+        elif name.endswith('.txt'):
+            with _open_binary(source) as f:
+                raw = f.read(max_chars * 4 + 4) if max_chars else f.read()
+            # Decode ketat seperti sebelumnya (byte tidak valid -> gagal baca); final=False hanya menahan
+            # karakter multi-byte yang terpotong di ujung pembacaan yang dibatasi max_chars
+            text = codecs.getincrementaldecoder('utf-8')().decode(raw, final=not max_chars)
+            parts.append(text[:max_chars + 1] if max_chars else text)
     except Exception as e:
         print(f"Error Read File: {e}")
+        metrics.extract_seconds.observe(time.perf_counter() - start, kind=kind, outcome="error")
         return None
-    return text.strip()
\ No newline at end of file
+    metrics.extract_seconds.observe(time.perf_counter() - start, kind=kind, outcome="ok")
+    return "\n".join(parts).strip()
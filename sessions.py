@@ -0,0 +1,434 @@
+import time
+import zlib
+import sqlite3
+import asyncio
+import threading
+from collections import OrderedDict
+import config
+
+# Teks per pesan (input, ringkasan, terjemahan) disimpan di sini, bukan di context.user_data,
+# supaya memori proses tetap terbatas walaupun pengguna tidak pernah menekan "Selesai".
+# Status tombol (debounce tekan ganda) dan foto album juga di sini, agar dibagi antar worker webhook.
+
+# Tombol yang tidak pernah ditandai selesai (worker mati) dianggap lepas setelah sekian detik;
+# foto album yang tidak pernah diambil dibuang setelah waktu yang sama
+COORDINATION_TTL = 600
+
+def _pack(text: str, compress: bool):
+    data = text.encode('utf-8')
+    if compress:
+        return zlib.compress(data, 6), True
+    return data, False
+
+def _unpack(data: bytes, compressed: bool) -> str:
+    if compressed:
+        data = zlib.decompress(data)
+    return data.decode('utf-8')
+
+class MemorySessionBackend:
+    """Backend di memori proses: LRU global + LRU per pengguna, dihitung dalam byte."""
+
+    def __init__(self):
+        self._entries = OrderedDict()  # (user_id, data_id) -> [data, compressed, accessed_at, expires_at]
+        self._users = {}               # user_id -> OrderedDict(data_id -> None) urut akses
+        self._user_bytes = {}
+        self.total_bytes = 0
+        self._callbacks = {}  # (chat_id, data) -> [started_at, finished_at atau None]
+        self._media = {}      # group_id -> {message_id: (file_id, added_at)}
+
+    def get(self, user_id, data_id, now, expires_at):
+        key = (user_id, data_id)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[3] < now:
+            self._remove(key)
+            return None
+        entry[2] = now
+        entry[3] = expires_at
+        self._entries.move_to_end(key)
+        self._users[user_id].move_to_end(data_id)
+        return entry[0], entry[1]
+
+    def put(self, user_id, data_id, data, compressed, now, expires_at):
+        key = (user_id, data_id)
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = [data, compressed, now, expires_at]
+        self._users.setdefault(user_id, OrderedDict())[data_id] = None
+        self._user_bytes[user_id] = self._user_bytes.get(user_id, 0) + len(data)
+        self.total_bytes += len(data)
+
+    def _remove(self, key):
+        user_id, data_id = key
+        data = self._entries.pop(key)[0]
+        self.total_bytes -= len(data)
+        self._user_bytes[user_id] -= len(data)
+        user_keys = self._users[user_id]
+        del user_keys[data_id]
+        if not user_keys:
+            del self._users[user_id]
+            del self._user_bytes[user_id]
+
+    def clear_user(self, user_id):
+        for data_id in list(self._users.get(user_id, ())):
+            self._remove((user_id, data_id))
+
+    def enforce(self, user_id, data_id, max_user_bytes, max_total_bytes) -> int:
+        """Buang entri paling lama tidak dipakai sampai budget terpenuhi. Entri yang baru ditulis tidak ikut dibuang."""
+        evicted = 0
+        user_keys = self._users.get(user_id, {})
+        while max_user_bytes and self._user_bytes.get(user_id, 0) > max_user_bytes and len(user_keys) > 1:
+            oldest = next(iter(user_keys))
+            self._remove((user_id, oldest))
+            evicted += 1
+        keep = (user_id, data_id)
+        while max_total_bytes and self.total_bytes > max_total_bytes and len(self._entries) > 1:
+            oldest = next(iter(self._entries))
+            if oldest == keep:
+                self._entries.move_to_end(keep)
+                continue
+            self._remove(oldest)
+            evicted += 1
+        return evicted
+
+    def sweep(self, now, compress_before) -> tuple:
+        """Hapus entri kedaluwarsa dan kompres entri yang lama tidak diakses."""
+        expired = [key for key, entry in self._entries.items() if entry[3] < now]
+        for key in expired:
+            self._remove(key)
+        compressed = 0
+        if compress_before:
+            for key, entry in self._entries.items():
+                # Urutan LRU: begitu ketemu entri yang masih "hangat", sisanya juga hangat
+                if entry[2] >= compress_before:
+                    break
+                if entry[1]:
+                    continue
+                packed = zlib.compress(entry[0], 6)
+                saved = len(entry[0]) - len(packed)
+                if saved <= 0:
+                    continue
+                entry[0], entry[1] = packed, True
+                self.total_bytes -= saved
+                self._user_bytes[key[0]] -= saved
+                compressed += 1
+        return len(expired), compressed
+
+    def claim_callback(self, chat_id, data, now, debounce) -> bool:
+        state = self._callbacks.get((chat_id, data))
+        if state is not None:
+            started_at, finished_at = state
+            if finished_at is None and now - started_at < COORDINATION_TTL:
+                return False
+            if finished_at is not None and now - finished_at < debounce:
+                return False
+        self._callbacks[(chat_id, data)] = [now, None]
+        return True
+
+    def finish_callback(self, chat_id, data, now):
+        state = self._callbacks.get((chat_id, data))
+        if state is not None:
+            state[1] = now
+
+    def add_media(self, group_id, message_id, file_id, now):
+        self._media.setdefault(group_id, {})[message_id] = (file_id, now)
+
+    def take_media(self, group_id, quiet_before):
+        photos = self._media.get(group_id)
+        if not photos:
+            return []
+        if max(added_at for _, added_at in photos.values()) > quiet_before:
+            return None
+        del self._media[group_id]
+        return [photos[message_id][0] for message_id in sorted(photos)]
+
+    def sweep_coordination(self, now):
+        for key, (started_at, finished_at) in list(self._callbacks.items()):
+            if now - (finished_at or started_at) > COORDINATION_TTL:
+                del self._callbacks[key]
+        for group_id, photos in list(self._media.items()):
+            if now - max(added_at for _, added_at in photos.values()) > COORDINATION_TTL:
+                del self._media[group_id]
+
+    def stats(self) -> dict:
+        return {
+            "backend": "memory",
+            "items": len(self._entries),
+            "users": len(self._users),
+            "bytes": self.total_bytes,
+            "compressed_items": sum(1 for entry in self._entries.values() if entry[1])
+        }
+
+class SqliteSessionBackend:
+    """Backend SQLite: data bertahan saat restart dan bisa dipakai bersama oleh beberapa proses/worker."""
+
+    def __init__(self, db_path: str):
+        self._db = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._lock = threading.Lock()
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS session_texts ("
+            "user_id INTEGER NOT NULL, data_id TEXT NOT NULL, data BLOB NOT NULL, "
+            "compressed INTEGER NOT NULL, size INTEGER NOT NULL, "
+            "accessed_at REAL NOT NULL, expires_at REAL NOT NULL, "
+            "PRIMARY KEY (user_id, data_id))"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_session_accessed ON session_texts (accessed_at)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS callback_state ("
+            "chat_id INTEGER NOT NULL, data TEXT NOT NULL, started_at REAL NOT NULL, finished_at REAL, "
+            "PRIMARY KEY (chat_id, data))"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS media_groups ("
+            "group_id TEXT NOT NULL, message_id INTEGER NOT NULL, file_id TEXT NOT NULL, added_at REAL NOT NULL, "
+            "PRIMARY KEY (group_id, message_id))"
+        )
+        self._db.commit()
+
+    def get(self, user_id, data_id, now, expires_at):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT data, compressed, expires_at FROM session_texts WHERE user_id = ? AND data_id = ?",
+                (user_id, data_id)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[2] < now:
+                self._db.execute("DELETE FROM session_texts WHERE user_id = ? AND data_id = ?", (user_id, data_id))
+                self._db.commit()
+                return None
+            self._db.execute(
+                "UPDATE session_texts SET accessed_at = ?, expires_at = ? WHERE user_id = ? AND data_id = ?",
+                (now, expires_at, user_id, data_id)
+            )
+            self._db.commit()
+        return row[0], bool(row[1])
+
+    def put(self, user_id, data_id, data, compressed, now, expires_at):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO session_texts (user_id, data_id, data, compressed, size, accessed_at, expires_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (user_id, data_id, data, int(compressed), len(data), now, expires_at)
+            )
+            self._db.commit()
+
+    def clear_user(self, user_id):
+        with self._lock:
+            self._db.execute("DELETE FROM session_texts WHERE user_id = ?", (user_id,))
+            self._db.commit()
+
+    def _evict_rows(self, rows, total, limit, keep) -> list:
+        victims = []
+        for row in rows:
+            if total <= limit:
+                break
+            if (row[0], row[1]) == keep:
+                continue
+            victims.append((row[0], row[1]))
+            total -= row[2]
+        return victims
+
+    def enforce(self, user_id, data_id, max_user_bytes, max_total_bytes) -> int:
+        keep = (user_id, data_id)
+        evicted = 0
+        with self._lock:
+            if max_user_bytes:
+                rows = self._db.execute(
+                    "SELECT user_id, data_id, size FROM session_texts WHERE user_id = ? ORDER BY accessed_at",
+                    (user_id,)
+                ).fetchall()
+                victims = self._evict_rows(rows, sum(row[2] for row in rows), max_user_bytes, keep)
+                self._db.executemany("DELETE FROM session_texts WHERE user_id = ? AND data_id = ?", victims)
+                evicted += len(victims)
+            if max_total_bytes:
+                total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM session_texts").fetchone()[0]
+                if total > max_total_bytes:
+                    rows = self._db.execute(
+                        "SELECT user_id, data_id, size FROM session_texts ORDER BY accessed_at"
+                    ).fetchall()
+                    victims = self._evict_rows(rows, total, max_total_bytes, keep)
+                    self._db.executemany("DELETE FROM session_texts WHERE user_id = ? AND data_id = ?", victims)
+                    evicted += len(victims)
+            self._db.commit()
+        return evicted
+
+    def sweep(self, now, compress_before) -> tuple:
+        with self._lock:
+            expired = self._db.execute("DELETE FROM session_texts WHERE expires_at < ?", (now,)).rowcount
+            compressed = 0
+            if compress_before:
+                rows = self._db.execute(
+                    "SELECT user_id, data_id, data FROM session_texts WHERE compressed = 0 AND accessed_at < ?",
+                    (compress_before,)
+                ).fetchall()
+                for user_id, data_id, data in rows:
+                    packed = zlib.compress(data, 6)
+                    if len(packed) >= len(data):
+                        continue
+                    self._db.execute(
+                        "UPDATE session_texts SET data = ?, compressed = 1, size = ? WHERE user_id = ? AND data_id = ?",
+                        (packed, len(packed), user_id, data_id)
+                    )
+                    compressed += 1
+            self._db.commit()
+        return expired, compressed
+
+    def claim_callback(self, chat_id, data, now, debounce) -> bool:
+        # Satu statement upsert: atomik juga antar proses yang berbagi file SQLite
+        with self._lock:
+            cursor = self._db.execute(
+                "INSERT INTO callback_state (chat_id, data, started_at, finished_at) VALUES (?, ?, ?, NULL) "
+                "ON CONFLICT (chat_id, data) DO UPDATE SET started_at = excluded.started_at, finished_at = NULL "
+                "WHERE (finished_at IS NOT NULL AND finished_at <= ?) OR (finished_at IS NULL AND started_at <= ?)",
+                (chat_id, data, now, now - debounce, now - COORDINATION_TTL)
+            )
+            self._db.commit()
+        return cursor.rowcount == 1
+
+    def finish_callback(self, chat_id, data, now):
+        with self._lock:
+            self._db.execute(
+                "UPDATE callback_state SET finished_at = ? WHERE chat_id = ? AND data = ?", (now, chat_id, data)
+            )
+            self._db.commit()
+
+    def add_media(self, group_id, message_id, file_id, now):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO media_groups (group_id, message_id, file_id, added_at) VALUES (?, ?, ?, ?)",
+                (group_id, message_id, file_id, now)
+            )
+            self._db.commit()
+
+    def take_media(self, group_id, quiet_before):
+        # DELETE ... RETURNING memastikan hanya satu worker yang mendapat foto album
+        with self._lock:
+            rows = self._db.execute(
+                "DELETE FROM media_groups WHERE group_id = ? "
+                "AND (SELECT MAX(added_at) FROM media_groups WHERE group_id = ?) <= ? "
+                "RETURNING message_id, file_id",
+                (group_id, group_id, quiet_before)
+            ).fetchall()
+            waiting = not rows and self._db.execute(
+                "SELECT 1 FROM media_groups WHERE group_id = ? LIMIT 1", (group_id,)
+            ).fetchone() is not None
+            self._db.commit()
+        if waiting:
+            return None
+        return [file_id for _, file_id in sorted(rows)]
+
+    def sweep_coordination(self, now):
+        with self._lock:
+            self._db.execute(
+                "DELETE FROM callback_state WHERE COALESCE(finished_at, started_at) < ?", (now - COORDINATION_TTL,)
+            )
+            self._db.execute("DELETE FROM media_groups WHERE added_at < ?", (now - COORDINATION_TTL,))
+            self._db.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            items, users, total, compressed = self._db.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT user_id), COALESCE(SUM(size), 0), COALESCE(SUM(compressed), 0) "
+                "FROM session_texts"
+            ).fetchone()
+        return {"backend": "sqlite", "items": items, "users": users, "bytes": total, "compressed_items": compressed}
+
+class SessionStore:
+    """Penyimpanan teks per pesan dengan budget byte per pengguna & global, TTL, dan kompresi entri dingin."""
+
+    SWEEP_INTERVAL = 30
+
+    def __init__(self, backend, max_user_bytes: int, max_total_bytes: int, ttl: int, compress_after: int):
+        self.backend = backend
+        self.max_user_bytes = max_user_bytes
+        self.max_total_bytes = max_total_bytes
+        self.ttl = ttl
+        self.compress_after = compress_after
+        self.evictions = 0
+        self.expired = 0
+        self._last_sweep = 0.0
+        # Backend SQLite dijalankan di thread agar tidak memblokir event loop
+        self._threaded = isinstance(backend, SqliteSessionBackend)
+
+    async def _call(self, fn, *args):
+        if self._threaded:
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+
+    def _expires_at(self, now):
+        return now + self.ttl if self.ttl else float('inf')
+
+    async def get(self, user_id: int, data_id) -> str:
+        """Ambil teks; None jika tidak ada, kedaluwarsa, atau sudah dibuang (pesan "Data expired")."""
+        now = time.time()
+        entry = await self._call(self.backend.get, user_id, str(data_id), now, self._expires_at(now))
+        if entry is None:
+            return None
+        return _unpack(*entry)
+
+    async def put(self, user_id: int, data_id, text: str):
+        now = time.time()
+        data_id = str(data_id)
+        # Entri yang sendirian sudah melebihi budget pengguna langsung dikompres
+        compress = bool(self.max_user_bytes) and len(text) > self.max_user_bytes // 2
+        data, compressed = _pack(text, compress)
+        await self._call(self.backend.put, user_id, data_id, data, compressed, now, self._expires_at(now))
+        self.evictions += await self._call(
+            self.backend.enforce, user_id, data_id, self.max_user_bytes, self.max_total_bytes
+        )
+        if now - self._last_sweep >= self.SWEEP_INTERVAL:
+            await self.sweep(now)
+
+    async def sweep(self, now: float = None):
+        now = now or time.time()
+        self._last_sweep = now
+        compress_before = now - self.compress_after if self.compress_after else 0
+        expired, _ = await self._call(self.backend.sweep, now, compress_before)
+        self.expired += expired
+        await self._call(self.backend.sweep_coordination, now)
+
+    async def clear(self, user_id: int):
+        await self._call(self.backend.clear_user, user_id)
+
+    async def claim_callback(self, chat_id: int, data: str, debounce: float) -> bool:
+        """False jika tombol yang sama di chat yang sama masih diproses atau baru selesai < debounce detik lalu."""
+        return await self._call(self.backend.claim_callback, chat_id, data, time.time(), debounce)
+
+    async def finish_callback(self, chat_id: int, data: str):
+        await self._call(self.backend.finish_callback, chat_id, data, time.time())
+
+    async def add_media(self, group_id: str, message_id: int, file_id: str):
+        await self._call(self.backend.add_media, group_id, message_id, file_id, time.time())
+
+    async def take_media(self, group_id: str, quiet_for: float):
+        """
+        Ambil semua file_id foto album (urut pesan) jika tidak ada foto baru selama quiet_for detik.
+        None: foto masih berdatangan; list kosong: album sudah diambil worker lain.
+        """
+        return await self._call(self.backend.take_media, group_id, time.time() - quiet_for)
+
+    def stats(self) -> dict:
+        stats = self.backend.stats()
+        stats.update({
+            "evictions": self.evictions,
+            "expired": self.expired,
+            "max_user_bytes": self.max_user_bytes,
+            "max_total_bytes": self.max_total_bytes,
+            "ttl": self.ttl
+        })
+        return stats
+
+def create_session_store() -> SessionStore:
+    backend = SqliteSessionBackend(config.SESSION_DB) if config.SESSION_DB else MemorySessionBackend()
+    return SessionStore(
+        backend,
+        max_user_bytes=config.SESSION_USER_MAX_MB * 1024 * 1024,
+        max_total_bytes=config.SESSION_MAX_MB * 1024 * 1024,
+        ttl=config.SESSION_TTL,
+        compress_after=config.SESSION_COMPRESS_AFTER
+    )
+
+session_store = create_session_store()
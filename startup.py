@@ -0,0 +1,75 @@
+import time
+import logging
+import importlib
+import threading
+from contextlib import contextmanager
+
+# Modul ini di-import paling awal oleh main.py: waktu di bawah dianggap awal proses
+PROCESS_START = time.perf_counter()
+# Waktu dinding yang sama, untuk dibandingkan dengan mtime file
+PROCESS_START_TIME = time.time()
+
+logger = logging.getLogger(__name__)
+
+class StartupReport:
+    """Catat durasi import, inisialisasi, dan pemuatan backend lazy sejak proses dimulai."""
+
+    def __init__(self):
+        self.phases = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def measure(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name: str, seconds: float):
+        with self._lock:
+            self.phases.append({
+                "phase": name,
+                "seconds": round(seconds, 4),
+                "at": round(time.perf_counter() - PROCESS_START, 4)
+            })
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            phases = list(self.phases)
+        return {"uptime": round(time.perf_counter() - PROCESS_START, 3), "phases": phases}
+
+    def summary(self) -> str:
+        lines = ["Laporan startup (detik sejak proses mulai | durasi):"]
+        for phase in self.as_dict()["phases"]:
+            lines.append(f"  {phase['at']:>8.3f}s | {phase['seconds']:>7.3f}s  {phase['phase']}")
+        return "\n".join(lines)
+
+report = StartupReport()
+
+class LazyModule:
+    """Proxy modul yang baru di-import saat atributnya pertama kali dipakai (biaya import masuk laporan startup)."""
+
+    def __init__(self, name: str, on_load=None):
+        self._name = name
+        self._on_load = on_load
+        self._module = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    with report.measure(f"lazy import {self._name}"):
+                        module = importlib.import_module(self._name)
+                        if self._on_load:
+                            self._on_load(module)
+                    self._module = module
+        return self._module
+
+    @property
+    def loaded(self) -> bool:
+        return self._module is not None
+
+    def __getattr__(self, attr):
+        return getattr(self.load(), attr)